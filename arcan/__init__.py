@@ -0,0 +1 @@
+"""Arcan financial report aggregation helpers shared by the Streamlit app."""
@@ -0,0 +1,105 @@
+"""Command line entry point.
+
+Usage:
+    python -m arcan aggregate --month 09 --year 2026 ./inbox [--output DIR] [--upload --box-user ID [--force]]
+    python -m arcan worker [--processes N]
+
+aggregate builds every property package from the reports in the inbox
+directory, writes them to the output directory and, with --upload, uploads
+them to Box as the stored Box user (who must have logged in through the app
+once); properties already uploaded from the same reports are skipped
+unless --force is given. The run summary, with per-stage timings, is
+printed as JSON (or written to --summary). Exits 1 if any package failed.
+
+worker processes Merge & Upload jobs queued by the app (see arcan.jobs)
+until it gets SIGTERM.
+"""
+import argparse
+import json
+import logging
+import sys
+
+from arcan.box import MONTH_NAMES
+from arcan.config import INTAKE_WORKERS, JOB_WORKERS
+
+
+def _access_token_source(box_user_id):
+    """Callable returning a valid access token for the stored Box user."""
+    from arcan.tokens import TokenManager
+
+    manager = TokenManager()
+
+    def access_token():
+        tokens = manager.get(box_user_id)
+        if not tokens:
+            raise RuntimeError(f"No valid Box tokens for user {box_user_id} - log in through the app")
+        return tokens["access_token"]
+
+    # Fail before any work is done if the user can't be authenticated
+    access_token()
+    return access_token
+
+
+def aggregate_command(args):
+    from arcan.aggregate import aggregate, read_inbox
+
+    access_token = _access_token_source(args.box_user) if args.upload else None
+    uploads = read_inbox(args.inbox)
+    logging.info("Read %d files from %s", len(uploads), args.inbox)
+
+    def on_package(result):
+        if result["error"]:
+            status = f"failed: {result['error']}"
+        else:
+            status = "unchanged, skipped" if result.get("unchanged") else "done"
+        logging.info("%s: %s", result["property"], status)
+
+    summary = aggregate(uploads, args.month, args.year, output_dir=args.output, access_token=access_token,
+                        workers=args.workers, on_package=on_package, box_user_id=args.box_user, force=args.force)
+    text = json.dumps(summary, indent=2)
+    if args.summary:
+        with open(args.summary, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if any(result["error"] for result in summary["properties"]) else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m arcan", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    aggregate_parser = commands.add_parser("aggregate", help="build property packages from an inbox directory")
+    aggregate_parser.add_argument("inbox", help="directory of report PDFs and Excel files")
+    aggregate_parser.add_argument("--month", required=True, choices=sorted(MONTH_NAMES), help="two-digit month")
+    aggregate_parser.add_argument("--year", required=True)
+    aggregate_parser.add_argument("--output", default="packages", help="output directory (default: %(default)s)")
+    aggregate_parser.add_argument("--upload", action="store_true", help="also upload packages to Box")
+    aggregate_parser.add_argument("--box-user", help="Box user ID whose stored tokens are used for --upload")
+    aggregate_parser.add_argument("--force", action="store_true",
+                                  help="rebuild and upload properties whose packages are unchanged in Box")
+    aggregate_parser.add_argument("--workers", type=int, default=INTAKE_WORKERS,
+                                  help="worker processes (default: %(default)s)")
+    aggregate_parser.add_argument("--summary", help="write the JSON summary here instead of stdout")
+
+    worker_parser = commands.add_parser("worker", help="process queued Merge & Upload jobs")
+    worker_parser.add_argument("--processes", type=int, default=JOB_WORKERS,
+                               help="worker processes (default: %(default)s)")
+    args = parser.parse_args(argv)
+
+    if args.command == "aggregate" and args.upload and not args.box_user:
+        parser.error("--upload needs --box-user")
+
+    # Progress goes to stderr so stdout stays machine-readable
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", stream=sys.stderr)
+    if args.command == "worker":
+        from arcan.jobs import serve
+
+        serve(args.processes)
+        return 0
+    return aggregate_command(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""Headless aggregation: intake -> group -> merge -> write/upload without the UI.
+
+Runs the same stages as the app's Merge & Upload flow for a whole inbox of
+reports. Classification and property merges run on a process pool across
+cores, Excel conversion on the LibreOffice pool. Packages are written to an
+output directory and, given a Box token source, uploaded as each one is
+ready. The result is a JSON-serialisable summary with per-stage timings.
+
+When uploading, properties whose packages are already in Box, built from
+the same reports, are skipped (see arcan.manifest) unless force is set.
+"""
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import as_completed
+from contextlib import contextmanager
+from pathlib import Path
+
+from arcan.box import FolderResolver, content_sha1, upload_to_box
+from arcan.config import INTAKE_WORKERS
+from arcan.intake import create_intake_executor, expected_reports, found_reports, group_uploads, run_intake
+from arcan.libreoffice import start_conversion_pool
+from arcan.manifest import (
+    manifest_output,
+    package_digest,
+    record_failure,
+    record_package,
+    record_skipped,
+    unchanged_package,
+)
+from arcan.merge import build_package
+
+logger = logging.getLogger(__name__)
+
+INBOX_EXTENSIONS = (".pdf", ".xlsx", ".xls")
+
+
+def read_inbox(inbox):
+    """(filename, bytes) for every report in the inbox directory, sorted by path."""
+    paths = sorted(path for path in Path(inbox).rglob("*")
+                   if path.is_file() and path.name.lower().endswith(INBOX_EXTENSIONS)
+                   and not path.name.startswith("."))
+    return [(path.name, path.read_bytes()) for path in paths]
+
+
+class StageTimer:
+    """Wall-clock seconds per stage; a stage entered repeatedly accumulates."""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+
+def aggregate(uploads, month_number, year, output_dir=None, access_token=None, workers=INTAKE_WORKERS,
+              on_package=None, box_user_id=None, force=False):
+    """Build (and optionally upload) every property package for the uploads.
+
+    uploads is a list of (filename, file_bytes). Packages are written to
+    output_dir if given. access_token, if given, is a callable returning a
+    valid Box access token; each package is uploaded as soon as it is built.
+    on_package(summary) is called for each finished property. Returns the
+    run summary dict; properties whose build or upload failed have "error"
+    set, skipped ones "unchanged". box_user_id goes into the run history.
+    """
+    timer = StageTimer()
+    summary = {"run_id": uuid.uuid4().hex, "month": month_number, "year": year, "files": len(uploads),
+               "properties": [], "unidentified": [], "warnings": [], "timings": timer.timings}
+    history = (summary["run_id"], box_user_id, month_number, year)
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    executor = create_intake_executor(workers)
+    conversion_pool = None
+    try:
+        with timer.stage("intake"):
+            conversion_pool = start_conversion_pool()
+            analyses = run_intake(uploads, executor=executor, conversion_pool=conversion_pool)
+
+        with timer.stage("group"):
+            grouped = group_uploads(uploads, analyses)
+        summary["warnings"].extend(grouped["warnings"])
+        summary["unidentified"] = ([item["filename"] for item in grouped["unidentified_property"]]
+                                   + [item["filename"] for item in grouped["unidentified_excel"]])
+        property_codes = grouped["property_codes"]
+        excel_files = grouped["excel_files"]
+
+        resolver = None
+        if access_token is not None and grouped["properties"]:
+            with timer.stage("upload"):
+                resolver = FolderResolver()
+                resolver.start_batch(access_token(), month_number, year)
+
+        # Merges run in the worker processes; each finished package is
+        # written and uploaded here while the rest are still merging
+        with timer.stage("merge"):
+            futures = {}
+            for prop_name, files in sorted(grouped["properties"].items()):
+                prop_code = property_codes.get(prop_name, "")
+                digest = None
+                if access_token is not None:
+                    with timer.stage("manifest"):
+                        digest = package_digest(files, excel_files.get(prop_code), prop_code, month_number, year)
+                        entries = None if force else unchanged_package(month_number, year, prop_name, digest,
+                                                                      access_token())
+                    if entries:
+                        result = _property_result(prop_name, prop_code, files, excel_files.get(prop_code))
+                        result["unchanged"] = True
+                        for kind, entry in entries.items():
+                            result[kind] = {"filename": entry["filename"], "box_file_id": entry["file_id"],
+                                            "box_folder_id": entry["folder_id"]}
+                        record_skipped(*history, prop_name, entries)
+                        summary["properties"].append(result)
+                        if on_package:
+                            on_package(result)
+                        continue
+                future = executor.submit(build_package, prop_name, files, prop_code, excel_files.get(prop_code),
+                                         month_number, year)
+                futures[future] = (prop_name, prop_code, files, digest)
+
+            for future in as_completed(futures):
+                prop_name, prop_code, files, digest = futures[future]
+                result = _property_result(prop_name, prop_code, files, excel_files.get(prop_code))
+                try:
+                    package = future.result()
+                    result["warnings"] = package["warnings"]
+                    result["pdf"] = dict(package["pdf_stats"], filename=package["pdf_filename"])
+                    if package["excel_data"] is not None:
+                        result["excel"] = {"filename": package["excel_filename"],
+                                           "output_bytes": len(package["excel_data"])}
+                    _deliver(package, result, output_dir, access_token, resolver, month_number, year, timer)
+                except Exception as e:
+                    logger.exception("Package for %s failed", prop_name)
+                    result["error"] = str(e)
+                if access_token is not None:
+                    _record(history, result, digest)
+                summary["properties"].append(result)
+                if on_package:
+                    on_package(result)
+    finally:
+        executor.shutdown()
+        if conversion_pool is not None:
+            conversion_pool.shutdown()
+
+    summary["properties"].sort(key=lambda item: item["property"])
+    timer.timings["total"] = time.perf_counter() - start
+    return summary
+
+
+def _property_result(prop_name, prop_code, files, excel_data):
+    found = found_reports(files, prop_code, excel_data)
+    return {
+        "property": prop_name,
+        "code": prop_code,
+        "reports": sorted(found),
+        "missing": sorted(expected_reports(prop_code) - found),
+        "pdf": None,
+        "excel": None,
+        "warnings": [],
+        "error": None,
+    }
+
+
+def _record(history, result, digest):
+    """Add an uploaded (or failed) property to the manifest and run history."""
+    outputs = {kind: result[kind] for kind in ("pdf", "excel") if result[kind] and result[kind].get("sha1")}
+    if result["error"] or not outputs:
+        record_failure(*history, result["property"], result["error"])
+        return
+    record_package(*history, result["property"], digest, {
+        kind: manifest_output({"filename": entry["filename"], "status": "success", "file_id": entry.get("box_file_id"),
+                               "folder_id": entry["box_folder_id"]}, entry["sha1"])
+        for kind, entry in outputs.items()})
+
+
+def _deliver(package, result, output_dir, access_token, resolver, month_number, year, timer):
+    """Write a built package to output_dir and/or upload it to Box."""
+    outputs = [(result["pdf"], package["pdf_filename"], package["pdf_data"])]
+    if result["excel"] is not None:
+        outputs.append((result["excel"], package["excel_filename"], package["excel_data"]))
+
+    for entry, filename, data in outputs:
+        if output_dir is not None:
+            with timer.stage("write"):
+                path = Path(output_dir) / filename
+                path.write_bytes(data)
+                entry["path"] = str(path)
+        if access_token is not None:
+            with timer.stage("upload"):
+                entry["sha1"] = content_sha1(data)
+                uploaded, _, folder_id = upload_to_box(access_token(), data, filename, month_number, year,
+                                                       resolver=resolver, sha1=entry["sha1"])
+                entry["box_folder_id"] = folder_id
+                if isinstance(uploaded, dict) and uploaded.get("entries"):
+                    entry["box_file_id"] = uploaded["entries"][0]["id"]
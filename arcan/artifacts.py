@@ -0,0 +1,191 @@
+"""Session-scoped store for uploaded and generated files.
+
+Merged packages used to live as raw bytes in st.session_state for the
+download buttons, so memory grew with users x packages x package size.
+Artifacts are written through a spooling writer instead: small ones stay in
+memory, anything over ARTIFACT_SPOOL_MAX goes to a file under ARTIFACT_DIR.
+Session state only holds the artifact ID. Artifacts not read for
+ARTIFACT_TTL seconds are dropped.
+
+The spool is a named file rather than a SpooledTemporaryFile so that each
+reader (a download and a Box upload, say) can open its own handle with its
+own position.
+
+Uploads are not copied in here: Streamlit already keeps them in its own
+per-session upload store, and intake only references those bytes for the
+length of a rerun. Packages uploaded to Box are streamed from the artifact,
+in chunks above BOX_CHUNKED_UPLOAD_THRESHOLD and as a streamed multipart
+body below it.
+"""
+import io
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from arcan.config import ARTIFACT_DIR, ARTIFACT_SPOOL_MAX, ARTIFACT_TTL
+
+
+class ArtifactExpired(KeyError):
+    """The artifact was cleaned up (TTL) or its session discarded."""
+
+
+class SpoolWriter:
+    """Write-once file that moves from memory to disk past max_size.
+
+    Supports write() and tell(), which is all PDF and zip writers need.
+    Closing it registers the artifact; its ID is then in artifact_id.
+    """
+
+    def __init__(self, store, session_id, name):
+        self._store = store
+        self._session_id = session_id
+        self._name = name
+        self._buffer = io.BytesIO()
+        self._file = None
+        self._path = None
+        self._size = 0
+        self.artifact_id = None
+
+    def write(self, data):
+        if self._file is None and self._size + len(data) > self._store.spool_max:
+            fd, self._path = tempfile.mkstemp(prefix="artifact-", dir=self._store.root)
+            self._file = os.fdopen(fd, "wb")
+            self._file.write(self._buffer.getbuffer())
+            self._buffer = None
+        (self._file or self._buffer).write(data)
+        self._size += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._size
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.artifact_id is not None:
+            return
+        if self._file is not None:
+            self._file.close()
+            data = None
+        else:
+            data = self._buffer.getvalue()
+            self._buffer = None
+        self.artifact_id = self._store._register(self._session_id, self._name, self._size, data, self._path)
+
+    def discard(self):
+        """Abandon a partly written artifact."""
+        if self._file is not None:
+            self._file.close()
+            os.unlink(self._path)
+        self._buffer = self._file = None
+        self.artifact_id = ""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class ArtifactStore:
+    """Thread-safe, process-wide artifact store keyed by artifact ID."""
+
+    def __init__(self, root=ARTIFACT_DIR, spool_max=ARTIFACT_SPOOL_MAX, ttl=ARTIFACT_TTL):
+        self.root = root
+        self.spool_max = spool_max
+        self.ttl = ttl
+        self._artifacts = {}
+        self._lock = threading.Lock()
+        if root:
+            os.makedirs(root, exist_ok=True)
+
+    def writer(self, session_id, name):
+        """A SpoolWriter for a new artifact; use as a context manager."""
+        return SpoolWriter(self, session_id, name)
+
+    def put(self, session_id, name, data):
+        """Store bytes and return the artifact ID."""
+        with self.writer(session_id, name) as writer:
+            writer.write(data)
+        return writer.artifact_id
+
+    def _register(self, session_id, name, size, data, path):
+        artifact_id = uuid.uuid4().hex
+        with self._lock:
+            self._artifacts[artifact_id] = {"session": session_id, "name": name, "size": size,
+                                            "data": data, "path": path, "touched": time.monotonic()}
+        self.cleanup()
+        return artifact_id
+
+    def _get(self, artifact_id):
+        with self._lock:
+            artifact = self._artifacts.get(artifact_id)
+            if artifact is None:
+                raise ArtifactExpired(artifact_id)
+            artifact["touched"] = time.monotonic()
+            return artifact
+
+    def exists(self, artifact_id):
+        with self._lock:
+            return artifact_id in self._artifacts
+
+    def size(self, artifact_id):
+        return self._get(artifact_id)["size"]
+
+    def open(self, artifact_id):
+        """A new readable, seekable binary file over the artifact."""
+        artifact = self._get(artifact_id)
+        if artifact["data"] is not None:
+            return io.BytesIO(artifact["data"])
+        return open(artifact["path"], "rb")
+
+    def read(self, artifact_id):
+        artifact = self._get(artifact_id)
+        if artifact["data"] is not None:
+            return artifact["data"]
+        with open(artifact["path"], "rb") as f:
+            return f.read()
+
+    def _remove(self, artifact_ids):
+        with self._lock:
+            removed = [self._artifacts.pop(artifact_id) for artifact_id in artifact_ids
+                       if artifact_id in self._artifacts]
+        for artifact in removed:
+            if artifact["path"]:
+                try:
+                    os.unlink(artifact["path"])
+                except FileNotFoundError:
+                    pass
+
+    def discard_session(self, session_id):
+        """Drop all of a session's artifacts (e.g. before it builds new ones)."""
+        with self._lock:
+            artifact_ids = [key for key, artifact in self._artifacts.items() if artifact["session"] == session_id]
+        self._remove(artifact_ids)
+
+    def cleanup(self):
+        """Drop artifacts nobody has read for ttl seconds."""
+        cutoff = time.monotonic() - self.ttl
+        with self._lock:
+            artifact_ids = [key for key, artifact in self._artifacts.items() if artifact["touched"] < cutoff]
+        self._remove(artifact_ids)
+
+    def stats(self):
+        with self._lock:
+            artifacts = list(self._artifacts.values())
+        return {
+            "artifacts": len(artifacts),
+            "memory_bytes": sum(a["size"] for a in artifacts if a["data"] is not None),
+            "disk_bytes": sum(a["size"] for a in artifacts if a["data"] is None),
+        }
+
+    def close(self):
+        with self._lock:
+            artifact_ids = list(self._artifacts)
+        self._remove(artifact_ids)
@@ -0,0 +1,660 @@
+"""Box API access: OAuth token exchange, folder resolution and uploads."""
+import base64
+import hashlib
+import io
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from arcan import db
+from arcan.config import (
+    BOX_CHUNKED_UPLOAD_THRESHOLD,
+    BOX_CLIENT_ID,
+    BOX_CLIENT_SECRET,
+    BOX_CONNECT_TIMEOUT,
+    BOX_FOLDER_LISTING_TTL,
+    BOX_HTTP_BACKOFF,
+    BOX_HTTP_POOL_SIZE,
+    BOX_HTTP_RETRIES,
+    BOX_READ_TIMEOUT,
+    BOX_REDIRECT_URI,
+    BOX_ROOT_FOLDER_ID,
+    BOX_UPLOAD_PART_RETRIES,
+    BOX_UPLOAD_PART_WORKERS,
+    BOX_UPLOAD_URL,
+)
+
+MONTH_NAMES = {
+    "01": "January", "02": "February", "03": "March", "04": "April",
+    "05": "May", "06": "June", "07": "July", "08": "August",
+    "09": "September", "10": "October", "11": "November", "12": "December"
+}
+
+# Access token lifetime when Box doesn't say (seconds)
+BOX_TOKEN_LIFETIME = 3600
+
+
+class BoxSession(requests.Session):
+    """requests.Session with default timeouts for every Box call."""
+
+    def __init__(self, timeout=(BOX_CONNECT_TIMEOUT, BOX_READ_TIMEOUT)):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+class _BoxRetry(Retry):
+    """Retry 5xx only for idempotent methods, but 429 for any method.
+
+    A 429 means Box turned the request away unprocessed, so resending a POST
+    (token refresh, upload) is safe. After a 5xx it may have been applied: a
+    refresh token is single-use, and upload parts already have their own
+    retries in _upload_part.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if status_code == 429:
+            return True
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def create_box_session(retries=BOX_HTTP_RETRIES, backoff=BOX_HTTP_BACKOFF, pool_size=BOX_HTTP_POOL_SIZE):
+    """HTTP client for Box with keep-alive pooling and retry/backoff.
+
+    Connections to api.box.com and upload.box.com are pooled and reused, so
+    only the first call to each host pays the TCP+TLS handshake. 429s are
+    retried for every method and 5xx for GET/HEAD/DELETE/OPTIONS only (see
+    _BoxRetry), with exponential backoff honoring Retry-After. Connection
+    errors are retried as nothing was sent; read errors aren't, so a slow
+    upload is never sent twice.
+    """
+    retry = _BoxRetry(
+        total=retries,
+        read=0,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        # PUT is idempotent, but the only PUTs are upload parts (see _BoxRetry)
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS - {"PUT"},
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    session = BoxSession()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def set_http_session(session):
+    """Use this session for all Box calls (the app passes its cached client)."""
+    global _http_session
+    _http_session = session
+
+
+def http():
+    """The process-wide Box HTTP session, created on first use."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                _http_session = create_box_session()
+    return _http_session
+
+
+def connection_stats(session=None):
+    """Per-host request and connection counts for the session's pools.
+
+    "reused" is the number of requests that didn't need a new connection
+    (and so skipped the TCP+TLS handshake).
+    """
+    session = session or http()
+    stats = {}
+    # The same adapter is mounted for http:// and https://
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            entry = stats.setdefault(pool.host, {"requests": 0, "connections": 0})
+            entry["requests"] += pool.num_requests
+            entry["connections"] += pool.num_connections
+    for entry in stats.values():
+        entry["reused"] = max(0, entry["requests"] - entry["connections"])
+    return stats
+
+
+def month_folder_name(month_number):
+    """Box folder name for a month, e.g. "09 September"."""
+    month_name = MONTH_NAMES.get(month_number, "Unknown")
+    return f"{month_number} {month_name}"
+
+
+def get_box_user_info(access_token):
+    """Get the current Box user's info."""
+    response = http().get(
+        "https://api.box.com/2.0/users/me",
+        headers={"Authorization": f"Bearer {access_token}"}
+    )
+    if response.status_code == 200:
+        data = response.json()
+        return {
+            "id": data.get("id"),
+            "name": data.get("name"),
+            "email": data.get("login")
+        }
+    return None
+
+
+def exchange_code_for_tokens(code):
+    """Exchange authorization code for (access_token, refresh_token, expires_in)."""
+    response = http().post(
+        "https://api.box.com/oauth2/token",
+        data={
+            "grant_type": "authorization_code",
+            "code": code,
+            "client_id": BOX_CLIENT_ID,
+            "client_secret": BOX_CLIENT_SECRET,
+            "redirect_uri": BOX_REDIRECT_URI,
+        }
+    )
+
+    if response.status_code == 200:
+        data = response.json()
+        return data["access_token"], data["refresh_token"], data.get("expires_in", BOX_TOKEN_LIFETIME)
+    else:
+        raise Exception(f"Failed to get tokens: {response.text}")
+
+
+def refresh_access_token(refresh_token):
+    """Refresh the access token.
+
+    Returns (access_token, refresh_token, expires_in), or Nones on failure.
+    """
+    response = http().post(
+        "https://api.box.com/oauth2/token",
+        data={
+            "grant_type": "refresh_token",
+            "refresh_token": refresh_token,
+            "client_id": BOX_CLIENT_ID,
+            "client_secret": BOX_CLIENT_SECRET,
+        }
+    )
+
+    if response.status_code == 200:
+        data = response.json()
+        return data["access_token"], data["refresh_token"], data.get("expires_in", BOX_TOKEN_LIFETIME)
+    else:
+        return None, None, None
+
+
+class BoxListingError(Exception):
+    """A folder listing request failed."""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.text = response.text
+        super().__init__(f"Folder listing failed (status {response.status_code}): {response.text}")
+
+
+# Box's maximum page size for folder listings
+FOLDER_PAGE_SIZE = 1000
+
+
+def iter_folder_items(headers, folder_id, fields="id,name,type"):
+    """Yield the items of a Box folder, following marker-based pagination.
+
+    Only the requested fields are fetched, at the maximum page size, and the
+    next page is only requested if the caller keeps iterating - so lookups
+    that find their match early stop early.
+    """
+    params = {"fields": fields, "limit": FOLDER_PAGE_SIZE, "usemarker": "true"}
+    while True:
+        response = http().get(
+            f"https://api.box.com/2.0/folders/{folder_id}/items",
+            headers=headers,
+            params=params
+        )
+        if response.status_code != 200:
+            raise BoxListingError(response)
+
+        data = response.json()
+        yield from data.get("entries", [])
+
+        next_marker = data.get("next_marker")
+        if not next_marker:
+            return
+        params = {**params, "marker": next_marker}
+
+
+def _find_child_folder(headers, parent_id, name):
+    """Return the ID of the child folder with this name, or None."""
+    try:
+        for item in iter_folder_items(headers, parent_id):
+            if item["type"] == "folder" and item["name"] == name:
+                return item["id"]
+    except BoxListingError as e:
+        if parent_id == BOX_ROOT_FOLDER_ID:
+            raise Exception(f"Cannot access root folder (status {e.status_code}): {e.text}")
+    return None
+
+
+def find_or_create_folder(headers, parent_id, name):
+    """Find a child folder by name, creating it if it doesn't exist."""
+    folder_id = _find_child_folder(headers, parent_id, name)
+    if folder_id:
+        return folder_id
+
+    response = http().post(
+        "https://api.box.com/2.0/folders",
+        headers={**headers, "Content-Type": "application/json"},
+        json={"name": name, "parent": {"id": parent_id}}
+    )
+    if response.status_code == 201:
+        return response.json()["id"]
+    elif response.status_code == 409:
+        # Folder already exists (created concurrently) - refetch
+        return _find_child_folder(headers, parent_id, name)
+    else:
+        raise Exception(f"Failed to create folder {name} (status {response.status_code}): {response.text}")
+
+
+class FolderResolver:
+    """Resolves year and month folder IDs once and caches them.
+
+    IDs are kept in memory and in the box_folders table, keyed by
+    (parent folder ID, folder name), so only the first batch ever lists or
+    creates folders. Cached IDs aren't re-checked on every lookup; the
+    uploader invalidates them when an upload into the folder returns 404.
+
+    The files in each month folder are also listed (name -> ID and sha1)
+    so the uploader knows about name conflicts before sending any bytes.
+    A listing is reused for listing_ttl seconds and kept current by the
+    uploads themselves.
+    """
+
+    def __init__(self, root_folder_id=BOX_ROOT_FOLDER_ID, persist=True, listing_ttl=BOX_FOLDER_LISTING_TTL):
+        self.root_folder_id = root_folder_id
+        self.persist = persist
+        self.listing_ttl = listing_ttl
+        self._ids = {}
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, access_token, parent_id, name):
+        """Folder ID for `name` inside `parent_id`, creating the folder if needed."""
+        key = (parent_id, name)
+        with self._lock:
+            folder_id = self._ids.get(key)
+            if folder_id:
+                return folder_id
+
+            if self.persist:
+                folder_id = db.load_folder_id(parent_id, name)
+            if not folder_id:
+                headers = {"Authorization": f"Bearer {access_token}"}
+                folder_id = find_or_create_folder(headers, parent_id, name)
+                if not folder_id:
+                    raise Exception(f"Could not find or create folder {name}")
+                if self.persist:
+                    db.save_folder_id(parent_id, name, folder_id)
+
+            self._ids[key] = folder_id
+            return folder_id
+
+    def month_folder(self, access_token, month_number, year):
+        """Return (folder_name, folder_id) for the month folder, e.g. 2026 / 09 September."""
+        year_folder_id = self.resolve(access_token, self.root_folder_id, year)
+        folder_name = month_folder_name(month_number)
+        return folder_name, self.resolve(access_token, year_folder_id, folder_name)
+
+    def start_batch(self, access_token, month_number, year):
+        """Resolve the month folder and list its files afresh; call once per batch."""
+        folder_name, folder_id = self.month_folder(access_token, month_number, year)
+        self.folder_files(access_token, folder_id, refresh=True)
+        return folder_name, folder_id
+
+    def folder_files(self, access_token, folder_id, refresh=False):
+        """{name: {"id", "sha1"}} for the files in a folder, listed at most
+        once per listing_ttl seconds unless refresh is set."""
+        with self._lock:
+            listed = self._files.get(folder_id)
+        if listed and not refresh and time.monotonic() - listed[0] < self.listing_ttl:
+            return listed[1]
+
+        headers = {"Authorization": f"Bearer {access_token}"}
+        files = {item["name"]: {"id": item["id"], "sha1": item.get("sha1")}
+                 for item in iter_folder_items(headers, folder_id, fields="id,name,type,sha1")
+                 if item["type"] == "file"}
+        with self._lock:
+            self._files[folder_id] = (time.monotonic(), files)
+        return files
+
+    def file_uploaded(self, folder_id, name, file_id, sha1):
+        """Record an upload in the folder's listing, if it has one."""
+        with self._lock:
+            listed = self._files.get(folder_id)
+            if listed:
+                if file_id:
+                    listed[1][name] = {"id": file_id, "sha1": sha1}
+                else:
+                    listed[1].pop(name, None)
+
+    def invalidate_month(self, month_number, year):
+        """Drop the cached year and month folder IDs (e.g. after a 404 on upload)."""
+        with self._lock:
+            year_folder_id = self._ids.pop((self.root_folder_id, year), None)
+            keys = [(self.root_folder_id, year)]
+            if year_folder_id:
+                keys.append((year_folder_id, month_folder_name(month_number)))
+                self._files.pop(self._ids.pop(keys[-1], None), None)
+            if self.persist:
+                for parent_id, name in keys:
+                    db.delete_folder_id(parent_id, name)
+
+
+def _payload_size(file_data):
+    """Size of bytes or of a seekable binary file."""
+    if isinstance(file_data, (bytes, bytearray, memoryview)):
+        return len(file_data)
+    file_data.seek(0, io.SEEK_END)
+    return file_data.tell()
+
+
+def content_sha1(file_data):
+    """Hex SHA-1 of bytes or of a seekable binary file (what Box reports as sha1)."""
+    if isinstance(file_data, (bytes, bytearray, memoryview)):
+        return hashlib.sha1(file_data).hexdigest()
+    hasher = hashlib.sha1()
+    file_data.seek(0)
+    for block in iter(lambda: file_data.read(1024 * 1024), b""):
+        hasher.update(block)
+    return hasher.hexdigest()
+
+
+def file_sha1(access_token, file_id):
+    """SHA-1 of a Box file's current version, or None if it's gone or trashed."""
+    response = http().get(
+        f"https://api.box.com/2.0/files/{file_id}",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"fields": "sha1,item_status"}
+    )
+    if response.status_code != 200:
+        return None
+    data = response.json()
+    if data.get("item_status", "active") != "active":
+        return None
+    return data.get("sha1")
+
+
+def _conflict(response):
+    """The existing file a 409 upload collided with, if Box says."""
+    try:
+        conflicts = response.json().get("context_info", {}).get("conflicts")
+    except ValueError:
+        return None
+    if isinstance(conflicts, list):
+        conflicts = conflicts[0] if conflicts else None
+    return conflicts
+
+
+class _MultipartBody:
+    """A multipart/form-data upload body (attributes + file) that reads the
+    file in blocks as it is sent.
+
+    Passing a file to requests' files= builds the whole body in memory
+    first; this has a length and is read like a file, so requests streams
+    it. seek()/tell() let urllib3 rewind it for a retry.
+    """
+
+    def __init__(self, attributes, filename, file_data):
+        boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/form-data; boundary={boundary}"
+        quoted = filename.replace("\\", "\\\\").replace('"', "%22").replace("\r", "%0D").replace("\n", "%0A")
+        head = (f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="attributes"\r\n\r\n{attributes}\r\n'
+                f"--{boundary}\r\n"
+                f'Content-Disposition: form-data; name="file"; filename="{quoted}"\r\n'
+                f"Content-Type: application/octet-stream\r\n\r\n").encode()
+        if isinstance(file_data, (bytes, bytearray, memoryview)):
+            file_data = io.BytesIO(file_data)
+        self._parts = [io.BytesIO(head), file_data, io.BytesIO(f"\r\n--{boundary}--\r\n".encode())]
+        self._sizes = [len(head), _payload_size(file_data), len(boundary) + 8]
+        self.seek(0)
+
+    def __len__(self):
+        return sum(self._sizes)
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += len(self)
+        self._position = min(max(offset, 0), len(self))
+        remaining = self._position
+        for index, (part, size) in enumerate(zip(self._parts, self._sizes)):
+            part.seek(min(remaining, size))
+            if remaining < size:
+                self._index = index
+                break
+            remaining -= size
+        else:
+            self._index = len(self._parts)
+        return self._position
+
+    def read(self, size=-1):
+        chunks = []
+        while self._index < len(self._parts) and size != 0:
+            chunk = self._parts[self._index].read(size)
+            if not chunk:
+                self._index += 1
+                if self._index < len(self._parts):
+                    self._parts[self._index].seek(0)
+                continue
+            chunks.append(chunk)
+            self._position += len(chunk)
+            if size > 0:
+                size -= len(chunk)
+        return b"".join(chunks)
+
+
+def _post_file(headers, file_data, filename, folder_id=None, file_id=None):
+    """Upload a new file into folder_id, or a new version of file_id.
+
+    The body is streamed from file_data (see _MultipartBody), so only a
+    block of it is in memory at a time.
+    """
+    if file_id:
+        url = f"{BOX_UPLOAD_URL}/files/{file_id}/content"
+        attributes = {"name": filename}
+    else:
+        url = f"{BOX_UPLOAD_URL}/files/content"
+        attributes = {"name": filename, "parent": {"id": folder_id}}
+    # Seeks to the start itself, as the same file may be sent again (404 retry)
+    body = _MultipartBody(json.dumps(attributes), filename, file_data)
+    return http().post(
+        url,
+        headers={**headers, "Content-Type": body.content_type},
+        data=body
+    )
+
+
+# How many times to poll a commit that Box is still processing (202)
+BOX_COMMIT_ATTEMPTS = 30
+
+
+def _sha1_digest(hasher):
+    return "sha=" + base64.b64encode(hasher.digest()).decode()
+
+
+def _upload_part(headers, url, part_bytes, offset, total_size, part_sha1):
+    """PUT one part, retrying only this part on failure."""
+    part_headers = {
+        **headers,
+        "Content-Type": "application/octet-stream",
+        "Content-Range": f"bytes {offset}-{offset + len(part_bytes) - 1}/{total_size}",
+        "Digest": part_sha1,
+    }
+    for attempt in range(BOX_UPLOAD_PART_RETRIES + 1):
+        try:
+            response = http().put(url, headers=part_headers, data=part_bytes)
+            if response.status_code == 200:
+                return response.json()["part"]
+            error = f"status {response.status_code}: {response.text}"
+        except requests.RequestException as e:
+            error = str(e)
+        if attempt < BOX_UPLOAD_PART_RETRIES:
+            time.sleep(2 ** attempt)
+    raise Exception(f"Failed to upload part at offset {offset} ({error})")
+
+
+def upload_in_chunks(headers, file_data, filename, folder_id=None, file_id=None):
+    """Upload a large file (or, given file_id, a new version of one) through
+    a Box chunked upload session.
+
+    Parts are uploaded concurrently; the whole-file SHA-1 is computed in the
+    same pass that slices and hashes the parts. file_data may be bytes or a
+    seekable binary file, which is read one part at a time. Failed parts are
+    retried on their own, and the session is aborted if a part keeps failing.
+    Returns the session-creation response if Box refused it (e.g. 404/409),
+    otherwise the commit response.
+    """
+    total_size = _payload_size(file_data)
+    if file_id:
+        url = f"{BOX_UPLOAD_URL}/files/{file_id}/upload_sessions"
+        body = {"file_size": total_size, "file_name": filename}
+    else:
+        url = f"{BOX_UPLOAD_URL}/files/upload_sessions"
+        body = {"folder_id": folder_id, "file_size": total_size, "file_name": filename}
+    response = http().post(url, headers={**headers, "Content-Type": "application/json"}, json=body)
+    if response.status_code != 201:
+        return response
+
+    upload_session = response.json()
+    endpoints = upload_session["session_endpoints"]
+    part_size = upload_session["part_size"]
+
+    if isinstance(file_data, (bytes, bytearray, memoryview)):
+        data = memoryview(file_data)
+
+        def read_part(offset):
+            return data[offset:offset + part_size].tobytes()
+    else:
+        def read_part(offset):
+            file_data.seek(offset)
+            return file_data.read(part_size)
+
+    file_sha1 = hashlib.sha1()
+    futures = []
+    # Cap the part copies held in memory while uploads are in flight
+    in_flight = threading.BoundedSemaphore(BOX_UPLOAD_PART_WORKERS * 2)
+    try:
+        with ThreadPoolExecutor(max_workers=BOX_UPLOAD_PART_WORKERS) as executor:
+            for offset in range(0, total_size, part_size):
+                in_flight.acquire()
+                part_bytes = read_part(offset)
+                file_sha1.update(part_bytes)
+                future = executor.submit(
+                    _upload_part, headers, endpoints["upload_part"], part_bytes, offset, total_size,
+                    _sha1_digest(hashlib.sha1(part_bytes)))
+                future.add_done_callback(lambda _: in_flight.release())
+                futures.append(future)
+            parts = [future.result() for future in futures]
+    except Exception:
+        http().delete(endpoints["abort"], headers=headers)
+        raise
+
+    # Commit; Box answers 202 with Retry-After while it's still processing parts
+    commit_headers = {**headers, "Content-Type": "application/json", "Digest": _sha1_digest(file_sha1)}
+    for _ in range(BOX_COMMIT_ATTEMPTS):
+        response = http().post(endpoints["commit"], headers=commit_headers, json={"parts": parts})
+        if response.status_code != 202:
+            return response
+        time.sleep(int(response.headers.get("Retry-After", "1")))
+    raise Exception(f"Box did not finish processing the upload of {filename}")
+
+
+def _send_file(headers, file_data, filename, folder_id=None, file_id=None):
+    """Upload file content (a new file, or a new version of file_id), using
+    an upload session for large files."""
+    if _payload_size(file_data) >= BOX_CHUNKED_UPLOAD_THRESHOLD:
+        return upload_in_chunks(headers, file_data, filename, folder_id, file_id)
+    return _post_file(headers, file_data, filename, folder_id, file_id)
+
+
+def upload_to_box(access_token, file_data, filename, month_number, year, resolver=None, sha1=None):
+    """Upload file to Box, creating year and month folders if needed.
+
+    file_data is bytes or a seekable binary file (e.g. ArtifactStore.open()).
+    The month folder's listing says up front whether the name is taken: a
+    file with the same content is left alone (status "unchanged"), a
+    different one gets this upload as a new version (status "new version"),
+    so the body is sent once and no duplicates are created. sha1 is the
+    content's hex SHA-1, if the caller already has it.
+    """
+    headers = {"Authorization": f"Bearer {access_token}"}
+    if resolver is None:
+        resolver = FolderResolver()
+    sha1 = sha1 or content_sha1(file_data)
+
+    folder_name, month_folder_id = resolver.month_folder(access_token, month_number, year)
+    try:
+        existing = resolver.folder_files(access_token, month_folder_id).get(filename)
+    except BoxListingError as e:
+        if e.status_code != 404:
+            raise
+        # The cached folder was deleted in Box - resolve it again
+        resolver.invalidate_month(month_number, year)
+        folder_name, month_folder_id = resolver.month_folder(access_token, month_number, year)
+        existing = resolver.folder_files(access_token, month_folder_id).get(filename)
+
+    # The file can appear or disappear between the listing and the upload;
+    # each of those is followed once
+    for _ in range(3):
+        if existing and existing["sha1"] == sha1:
+            return ({"entries": [{"id": existing["id"], "name": filename, "sha1": sha1}], "status": "unchanged"},
+                    folder_name, month_folder_id)
+        if existing:
+            response = _send_file(headers, file_data, filename, file_id=existing["id"])
+            status = "new version"
+        else:
+            response = _send_file(headers, file_data, filename, month_folder_id)
+            status = "uploaded"
+            if response.status_code == 404:
+                # The cached folder was deleted in Box - resolve it again and retry once
+                resolver.invalidate_month(month_number, year)
+                folder_name, month_folder_id = resolver.month_folder(access_token, month_number, year)
+                response = _send_file(headers, file_data, filename, month_folder_id)
+
+        if response.status_code in (200, 201):
+            uploaded = response.json()
+            resolver.file_uploaded(month_folder_id, filename, uploaded["entries"][0]["id"], sha1)
+            return dict(uploaded, status=status), folder_name, month_folder_id
+        if existing and response.status_code == 404:
+            # Deleted since the folder was listed - upload it as a new file
+            resolver.file_uploaded(month_folder_id, filename, None, None)
+            existing = None
+        elif not existing and response.status_code == 409 and _conflict(response):
+            # Created since the folder was listed - upload a new version of it
+            conflict = _conflict(response)
+            existing = {"id": conflict["id"], "sha1": conflict.get("sha1")}
+        else:
+            break
+    raise Exception(f"Failed to upload (status {response.status_code}): {response.text}")
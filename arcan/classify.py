@@ -0,0 +1,125 @@
+"""PDF report classification: property name/code and T-12 vs YTD period.
+
+classify_pdf() is the single-pass path used by intake: it opens the document
+once and only extracts text from the header band of the first page.
+extract_property_info() and is_t12_or_ytd() are the original two-pass
+functions, kept for callers that only need one answer and as the benchmark
+baseline (see benchmarks/bench_classify.py).
+
+pdfplumber is imported inside the functions: it is slow to import and the
+app shouldn't pay for it before the first page render.
+"""
+import io
+import re
+
+# Fraction of the first page (from the top) that holds the report header
+HEADER_BAND_RATIO = 0.2
+
+MONTH_PATTERN = r'(Jan(?:uary)?|Feb(?:ruary)?|Mar(?:ch)?|Apr(?:il)?|May|Jun(?:e)?|Jul(?:y)?|Aug(?:ust)?|Sep(?:tember)?|Oct(?:ober)?|Nov(?:ember)?|Dec(?:ember)?)'
+# Date range patterns like "Jan 2026 - Dec 2026" or "February 2025 - January 2026"
+DATE_RANGE_RE = re.compile(rf'{MONTH_PATTERN}\s*\d{{4}}\s*[-–—to]+\s*{MONTH_PATTERN}\s*\d{{4}}', re.IGNORECASE)
+# "Property Name (code)" at start of lines - this pattern appears in report headers
+PROPERTY_HEADER_RE = re.compile(r'^([A-Za-z][A-Za-z0-9\s&\'-]+?)\s*\(([a-z0-9_]+)\)', re.MULTILINE)
+# Fallback header pattern: "Property = X" or similar
+PROPERTY_FIELD_RE = re.compile(r'Property\s*[=:]\s*([A-Za-z][A-Za-z0-9\s&\'-]+?)(?:\s*\(|\s*$|\s*Page)')
+
+
+def parse_period(text):
+    """Return 'T-12' or 'YTD' from a header's date range, or None."""
+    date_range = DATE_RANGE_RE.search(text)
+    if date_range:
+        start_month = date_range.group(1).lower()[:3]
+        # If starts in January, it's likely YTD
+        if start_month == 'jan':
+            return 'YTD'
+        else:
+            return 'T-12'
+    return None
+
+
+def parse_property(text):
+    """Return (property_name, property_code) from report header text."""
+    match = PROPERTY_HEADER_RE.search(text)
+    if match:
+        property_name = match.group(1).strip().title()
+        property_code = match.group(2).strip().lower()
+        return (property_name, property_code)
+
+    match = PROPERTY_FIELD_RE.search(text)
+    if match:
+        return (match.group(1).strip().title(), None)
+
+    return (None, None)
+
+
+def classify_pdf(file_bytes, need_period=True):
+    """Classify a PDF report in one pass over the header of its first page.
+
+    Returns a dict with "property_name", "property_code", "period" ('T-12',
+    'YTD' or None) and "error". The rest of the first page is extracted -
+    from the same open document - only if the header band is missing a
+    "Name (code)" header, or the date range when need_period is set.
+    """
+    import pdfplumber
+
+    result = {"property_name": None, "property_code": None, "period": None, "error": None}
+    try:
+        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+            if len(pdf.pages) == 0:
+                return result
+            page = pdf.pages[0]
+
+            header = page.crop((0, 0, page.width, page.height * HEADER_BAND_RATIO))
+            text = header.extract_text() or ""
+            property_name, property_code = parse_property(text)
+            period = parse_period(text)
+
+            if property_code is None or (need_period and period is None):
+                text = page.extract_text() or ""
+                if property_code is None:
+                    property_name, property_code = parse_property(text)
+                if period is None:
+                    period = parse_period(text)
+
+            result.update(property_name=property_name, property_code=property_code, period=period)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+def is_t12_or_ytd(file_bytes):
+    """Determine if a 12-month statement is T-12 or YTD based on date range.
+
+    T-12: spans 12 months (trailing 12)
+    YTD: starts in January, less than 12 months
+
+    Returns 'T-12' or 'YTD' or None if can't determine.
+    """
+    import pdfplumber
+
+    try:
+        with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+            if len(pdf.pages) > 0:
+                text = pdf.pages[0].extract_text() or ""
+                return parse_period(text)
+    except Exception:
+        pass
+
+    return None
+
+
+def extract_property_info(file_bytes):
+    """Extract property name and code from PDF content.
+
+    Looks for pattern like 'The Turn (turn)' and extracts both 'The Turn' and 'turn'.
+    Returns (property_name, property_code) tuple.
+    """
+    import pdfplumber
+
+    with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
+        if len(pdf.pages) > 0:
+            # Get text from first page
+            text = pdf.pages[0].extract_text() or ""
+            return parse_property(text)
+
+    return (None, None)
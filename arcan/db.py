@@ -0,0 +1,251 @@
+"""Postgres persistence shared by the app and background processes.
+
+All access goes through a process-wide ConnectionPool: callers borrow a
+connection with ``with get_pool().connection() as conn:`` instead of opening
+and tearing down a connection per call.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from arcan.config import (
+    DATABASE_URL,
+    DB_POOL_CHECK_IDLE,
+    DB_POOL_MAX,
+    DB_POOL_MIN,
+    DB_POOL_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    """No connection became free within the checkout timeout."""
+
+
+class ConnectionPool:
+    """Thread-safe Postgres connection pool with health-checked checkout.
+
+    Connections are opened lazily (the app still starts if the database is
+    down) and a connection that has been idle for a while is pinged before it
+    is handed out; a dead one is discarded and replaced. When all maxconn
+    connections are in use, checkout waits up to `timeout` seconds.
+    """
+
+    def __init__(self, dsn=DATABASE_URL, minconn=DB_POOL_MIN, maxconn=DB_POOL_MAX,
+                 timeout=DB_POOL_TIMEOUT, check_idle=DB_POOL_CHECK_IDLE):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.check_idle = check_idle
+        self._pool = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self.stats = {"checkouts": 0, "hits": 0, "new_connections": 0, "discarded": 0,
+                      "waits": 0, "wait_seconds": 0.0, "timeouts": 0}
+
+    def _get_pool(self):
+        with self._lock:
+            if self._pool is None:
+                from psycopg2.pool import ThreadedConnectionPool
+
+                self._pool = ThreadedConnectionPool(self.minconn, self.maxconn, self.dsn)
+            return self._pool
+
+    def _count(self, key):
+        # Sessions check out connections from many threads at once
+        with self._lock:
+            self.stats[key] += 1
+
+    def _checkout(self):
+        pool = self._get_pool()
+        while True:
+            conn = pool.getconn()
+            last_used = self._last_used.get(id(conn))
+            if last_used is None:
+                self._count("new_connections")
+                return conn
+            if conn.closed == 0 and (time.monotonic() - last_used < self.check_idle or self._ping(conn)):
+                self._count("hits")
+                return conn
+            # Dead connection (e.g. server restart or idle timeout) - replace it
+            self._count("discarded")
+            self._last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+
+    @staticmethod
+    def _ping(conn):
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success and rolls back on error."""
+        start = time.monotonic()
+        if not self._slots.acquire(blocking=False):
+            self._count("waits")
+            if not self._slots.acquire(timeout=self.timeout):
+                self._count("timeouts")
+                raise PoolTimeout(f"No database connection free after {self.timeout:.0f}s")
+        with self._lock:
+            self.stats["wait_seconds"] += time.monotonic() - start
+            self.stats["checkouts"] += 1
+
+        conn = None
+        try:
+            conn = self._checkout()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if conn.closed == 0:
+                    conn.rollback()
+                raise
+        finally:
+            if conn is not None:
+                if conn.closed == 0:
+                    self._last_used[id(conn)] = time.monotonic()
+                else:
+                    self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=conn.closed != 0)
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.closeall()
+                self._pool = None
+            self._last_used.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def set_pool(pool):
+    """Use this pool for all database access (the app passes its cached pool)."""
+    global _pool
+    _pool = pool
+
+
+def get_pool():
+    """The process-wide connection pool, created on first use."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def _epoch(timestamp):
+    return timestamp.timestamp() if timestamp is not None else None
+
+
+def _timestamp(epoch):
+    return datetime.fromtimestamp(epoch, timezone.utc) if epoch is not None else None
+
+
+def upsert_tokens(box_user_id, box_user_name, box_user_email, access_token, refresh_token, expires_at=None):
+    """Insert or replace a Box user's tokens (expires_at is epoch seconds)."""
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO box_tokens (box_user_id, box_user_name, box_user_email, access_token, refresh_token, expires_at)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                ON CONFLICT (box_user_id) DO UPDATE SET
+                    box_user_name = EXCLUDED.box_user_name,
+                    box_user_email = EXCLUDED.box_user_email,
+                    access_token = EXCLUDED.access_token,
+                    refresh_token = EXCLUDED.refresh_token,
+                    expires_at = EXCLUDED.expires_at
+            """, (box_user_id, box_user_name, box_user_email, access_token, refresh_token, _timestamp(expires_at)))
+
+
+def _token_row(row):
+    return {"access_token": row[0], "refresh_token": row[1], "name": row[2], "email": row[3],
+            "expires_at": _epoch(row[4])}
+
+
+def fetch_tokens(box_user_id):
+    """Return a Box user's tokens and profile, or None."""
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT access_token, refresh_token, box_user_name, box_user_email, expires_at FROM box_tokens WHERE box_user_id = %s", (box_user_id,))
+            row = cur.fetchone()
+    return _token_row(row) if row else None
+
+
+@contextmanager
+def locked_tokens(box_user_id):
+    """Lock a Box user's token row for the duration of the block.
+
+    Yields (tokens, save): tokens as fetch_tokens() returns them (None if
+    the user has no row) and save(access_token, refresh_token, expires_at)
+    to rotate them in the same transaction. Other processes refreshing the
+    same user wait on the row lock and then see the new tokens.
+    """
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT access_token, refresh_token, box_user_name, box_user_email, expires_at FROM box_tokens WHERE box_user_id = %s FOR UPDATE", (box_user_id,))
+            row = cur.fetchone()
+
+            def save(access_token, refresh_token, expires_at):
+                cur.execute("UPDATE box_tokens SET access_token = %s, refresh_token = %s, expires_at = %s WHERE box_user_id = %s",
+                            (access_token, refresh_token, _timestamp(expires_at), box_user_id))
+
+            yield (_token_row(row) if row else None), save
+
+
+def remove_tokens(box_user_id):
+    """Delete a Box user's tokens."""
+    with get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM box_tokens WHERE box_user_id = %s", (box_user_id,))
+
+
+def load_folder_id(parent_id, name):
+    """Look up a cached Box folder ID by parent folder and name."""
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("SELECT folder_id FROM box_folders WHERE parent_id = %s AND name = %s", (parent_id, name))
+                row = cur.fetchone()
+        return row[0] if row else None
+    except Exception as e:
+        # The folder index is only a cache - fall back to listing Box
+        logger.warning("Could not read folder index: %s", e)
+        return None
+
+
+def save_folder_id(parent_id, name, folder_id):
+    """Remember a Box folder ID for (parent folder, name)."""
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("""
+                    INSERT INTO box_folders (parent_id, name, folder_id)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT (parent_id, name) DO UPDATE SET folder_id = EXCLUDED.folder_id
+                """, (parent_id, name, folder_id))
+    except Exception as e:
+        logger.warning("Could not update folder index: %s", e)
+
+
+def delete_folder_id(parent_id, name):
+    """Forget a cached Box folder ID (e.g. the folder was deleted in Box)."""
+    try:
+        with get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute("DELETE FROM box_folders WHERE parent_id = %s AND name = %s", (parent_id, name))
+    except Exception as e:
+        logger.warning("Could not update folder index: %s", e)
@@ -0,0 +1,341 @@
+"""Intake stage: classify uploaded reports and convert Excel reports to PDF.
+
+PDF classification is CPU-bound (pdfplumber holds the GIL), so it runs on a
+process pool; Excel conversion runs on the LibreOffice pool at the same time.
+Every worker returns a small picklable analysis dict.
+"""
+import multiprocessing
+import re
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from arcan.classify import classify_pdf
+from arcan.config import INTAKE_WORKERS
+from arcan.libreoffice import excel_to_pdf
+
+# Keywords to identify each report type (in merge order)
+report_patterns = [
+    (1, "Balance Sheet", ["balance_sheet", "balance sheet", "balancesheet", "period_change", "periodchange"]),
+    (2, "T-12 Statement", ["12_month", "12 month", "12month", "t-12", "t12", "trailing"]),
+    (3, "YTD Statement", ["ytd", "year_to_date", "year-to-date", "yeartodate"]),
+    (4, "Budget Comparison", ["budget", "comparison"]),
+    (5, "Rent Roll", ["renrollwithleasecharges", "rent_roll", "rentroll", "lease_charges"]),
+    (6, "Aged Receivables", ["aging_summary", "agingsummary"]),
+    (7, "Payables Aging", ["payablesagingreport", "payablesaging"]),
+    (8, "General Ledger", ["general_ledger", "generalledger", "gl_detail", "gldetail"]),
+]
+
+# Properties that require Excel file with T-12, YTD, and General Ledger
+PROPERTIES_WITH_EXCEL = {"marshp", "emersn", "capella2", "55pharr"}
+
+# Report type -> key in the excel_files entry of a special property
+EXCEL_PACKAGE_SHEETS = {"T-12 Statement": "T-12", "YTD Statement": "YTD", "General Ledger": "GL"}
+EXCEL_PACKAGE_REPORTS = {key: report_type for report_type, key in EXCEL_PACKAGE_SHEETS.items()}
+
+# Reports every property package is expected to have
+BASE_EXPECTED_REPORTS = {"Balance Sheet", "T-12 Statement", "YTD Statement", "Budget Comparison",
+                         "Rent Roll", "Aged Receivables", "Payables Aging"}
+
+# Map property codes to full property names
+PROPERTY_NAMES = {
+    "marshp": "Marsh Point",
+    "emersn": "Emerson",
+    "capella2": "Capella",
+    "55pharr": "55 Pharr",
+}
+
+
+def identify_report(filename):
+    """Identify report type based on filename."""
+    filename_lower = filename.lower()
+    for order, name, keywords in report_patterns:
+        for keyword in keywords:
+            if keyword in filename_lower:
+                return (order, name)
+    return (99, "Unknown")
+
+
+def is_excel(filename):
+    return filename.lower().endswith(('.xlsx', '.xls'))
+
+
+def property_code_from_filename(filename_lower, extension_pattern):
+    """Extract a property code from a lowercased filename (e.g., "Report_marshp.pdf")."""
+    # First, search for known property codes anywhere in the filename
+    for code in PROPERTIES_WITH_EXCEL:
+        if f"_{code}" in filename_lower or f"_{code}." in filename_lower or f"_{code} " in filename_lower:
+            return code
+
+    # Fallback to regex pattern if no known code found
+    clean_filename = re.sub(extension_pattern, '', filename_lower)
+    # Remove trailing report type indicators (t12, ytd, etc.) before extracting property code
+    clean_filename = re.sub(r'[\s_]*(t12|ytd|t-12)[\s]*(\(\d+\))?$', '', clean_filename, flags=re.IGNORECASE)
+    code_match = re.search(r'_([a-z0-9]+)(?:\s*\(\d+\))?$', clean_filename)
+    return code_match.group(1) if code_match else None
+
+
+def analyze_excel(filename):
+    """Classify an Excel upload from its filename.
+
+    Excel reports that go into the PDF package are flagged with "needs_pdf";
+    the caller converts them and fills in "pdf_bytes" or "error".
+    """
+    filename_lower = filename.lower()
+
+    # Handle double extensions like .xls.xlsx
+    prop_code = property_code_from_filename(filename_lower, r'\.(xls\.xlsx|xlsx|xls)$')
+
+    # Identify report type using same patterns as PDFs
+    order, report_type = identify_report(filename)
+
+    # Check for YTD or T12 at end of filename to override detection
+    # This handles cases like "12_Month_Statement_marshp (1) YTD.xlsx"
+    name_without_ext = re.sub(r'\.(xlsx|xls)$', '', filename_lower)
+    if name_without_ext.endswith('ytd') or ' ytd' in name_without_ext:
+        order = 3
+        report_type = "YTD Statement"
+    elif name_without_ext.endswith('t12') or ' t12' in name_without_ext:
+        order = 2
+        report_type = "T-12 Statement"
+
+    return {
+        "kind": "excel",
+        "prop_name": None,
+        "prop_code": prop_code,
+        "order": order,
+        "report_type": report_type,
+        # Convert Excel to PDF for merging (skip General Ledger for PDF merge)
+        "needs_pdf": report_type != "General Ledger" and order != 99,
+        "pdf_bytes": None,
+        "error": None,
+        "classify_error": None,
+    }
+
+
+def analyze_pdf(filename, file_bytes):
+    """Classify a PDF upload from its header and filename (runs in a worker process)."""
+    filename_lower = filename.lower()
+
+    # Identify report type
+    order, report_type = identify_report(filename)
+
+    # Extract property name, code and (for 12-month statements) the T-12/YTD
+    # period from the report header in a single pass
+    classification = classify_pdf(file_bytes, need_period=report_type == "T-12 Statement")
+    prop_name = classification["property_name"]
+    prop_code = classification["property_code"]
+
+    # Fallback: extract property code from filename (e.g., "Report_marshp.pdf")
+    if not prop_code:
+        prop_code = property_code_from_filename(filename_lower, r'\.pdf$')
+
+    # Use property code as property name if we couldn't extract from PDF
+    if not prop_name and prop_code:
+        # Map common codes to property names
+        prop_name = PROPERTY_NAMES.get(prop_code, prop_code.title())
+
+    # If it's a 12-month statement, use the PDF content to determine T-12 vs YTD
+    if report_type == "T-12 Statement" and classification["period"] == "YTD":
+        order = 3
+        report_type = "YTD Statement"
+
+    return {
+        "kind": "pdf",
+        "prop_name": prop_name,
+        "prop_code": prop_code,
+        "order": order,
+        "report_type": report_type,
+        "needs_pdf": False,
+        "pdf_bytes": None,
+        "error": None,
+        "classify_error": classification["error"],
+    }
+
+
+def create_intake_executor(workers=INTAKE_WORKERS):
+    """Process pool for PDF classification.
+
+    Uses spawn rather than fork: the Streamlit server is multi-threaded and
+    forking it can deadlock the children.
+    """
+    return ProcessPoolExecutor(max_workers=max(1, workers),
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+def executor_is_healthy(executor):
+    """False once a worker process has died and the pool refuses new work."""
+    return not getattr(executor, "_broken", False)
+
+
+def run_intake(uploads, executor=None, conversion_pool=None, cache=None, on_progress=None):
+    """Classify uploaded files in parallel and convert Excel reports to PDF.
+
+    uploads is a list of (filename, file_bytes). Returns one analysis dict per
+    upload, in upload order regardless of completion order. Analyses found in
+    cache (an AnalysisCache-like object) skip all work; new successful ones
+    are added to it. on_progress(done, total) is called on the calling thread
+    as each file finishes.
+    """
+    total = len(uploads)
+    results = [None] * total
+    cache_keys = [None] * total
+    futures = {}
+    done = 0
+
+    def finish(index, analysis):
+        nonlocal done
+        results[index] = analysis
+        # Don't cache failures - a missing LibreOffice or timeout may be transient
+        if cache is not None and not analysis["error"]:
+            cache.put(cache_keys[index], analysis)
+        done += 1
+        if on_progress:
+            on_progress(done, total)
+
+    for index, (filename, file_bytes) in enumerate(uploads):
+        if cache is not None:
+            cache_keys[index] = cache.key_for(filename, file_bytes)
+            cached = cache.get(cache_keys[index])
+            if cached is not None:
+                results[index] = cached
+                done += 1
+                if on_progress:
+                    on_progress(done, total)
+                continue
+
+        if is_excel(filename):
+            analysis = analyze_excel(filename)
+            if not analysis["needs_pdf"]:
+                finish(index, analysis)
+            elif conversion_pool is not None:
+                futures[conversion_pool.submit(file_bytes)] = (index, analysis)
+            else:
+                try:
+                    analysis["pdf_bytes"] = excel_to_pdf(file_bytes)
+                except Exception as e:
+                    analysis["error"] = str(e)
+                finish(index, analysis)
+        elif executor is not None and executor_is_healthy(executor):
+            futures[executor.submit(analyze_pdf, filename, file_bytes)] = (index, None)
+        else:
+            finish(index, analyze_pdf(filename, file_bytes))
+
+    for future in as_completed(futures):
+        index, analysis = futures[future]
+        if analysis is not None:
+            # Excel conversion on the LibreOffice pool
+            try:
+                analysis["pdf_bytes"] = future.result()
+            except Exception as e:
+                analysis["error"] = str(e)
+        else:
+            try:
+                analysis = future.result()
+            except BrokenProcessPool:
+                # A worker died (e.g. OOM) - classify this file here instead
+                analysis = analyze_pdf(*uploads[index])
+        finish(index, analysis)
+
+    return results
+
+
+def _group_name(property_codes, prop_name, prop_code):
+    """Reuse the name already chosen for prop_code, if any."""
+    for name, code in property_codes.items():
+        if code == prop_code:
+            return name
+    return prop_name
+
+
+def group_uploads(uploads, analyses):
+    """Group analyzed uploads into per-property packages.
+
+    uploads is the list of (filename, file_bytes) given to run_intake and
+    analyses its result. Returns a dict with:
+
+    - properties: {property name: [{"filename", "bytes", "order", "report_type"}]}
+      in upload order; Excel reports carry their converted PDF bytes
+    - property_codes: {property name: property code}
+    - excel_files: {property code: {"T-12"|"YTD"|"GL": {"bytes", "filename"}}}
+      for PROPERTIES_WITH_EXCEL
+    - unidentified_property: report dicts whose property couldn't be found
+    - unidentified_excel: Excel uploads that aren't a known report
+    - warnings: messages for files that couldn't be classified or converted
+    """
+    grouped = {
+        "properties": defaultdict(list),
+        "property_codes": {},
+        "excel_files": defaultdict(dict),
+        "unidentified_property": [],
+        "unidentified_excel": [],
+        "warnings": [],
+    }
+    properties = grouped["properties"]
+    property_codes = grouped["property_codes"]
+
+    for (filename, file_bytes), analysis in zip(uploads, analyses):
+        if analysis["classify_error"]:
+            grouped["warnings"].append(f"Could not extract property info: {analysis['classify_error']}")
+        prop_name = analysis["prop_name"]
+        prop_code = analysis["prop_code"]
+        item = {"filename": filename, "bytes": file_bytes,
+                "order": analysis["order"], "report_type": analysis["report_type"]}
+
+        if analysis["kind"] == "excel":
+            report_type = analysis["report_type"]
+            # For special properties, track T-12, YTD, GL Excel files for merged Excel
+            if prop_code in PROPERTIES_WITH_EXCEL and report_type in EXCEL_PACKAGE_SHEETS:
+                grouped["excel_files"][prop_code][EXCEL_PACKAGE_SHEETS[report_type]] = {
+                    "bytes": file_bytes, "filename": filename}
+
+            if analysis["error"]:
+                grouped["warnings"].append(f"Could not convert {filename} to PDF: {analysis['error']}")
+            elif analysis["pdf_bytes"] is not None:
+                item["bytes"] = analysis["pdf_bytes"]
+                item["from_excel"] = True
+                prop_name = PROPERTY_NAMES.get(prop_code, prop_code.title() if prop_code else None)
+                if prop_name:
+                    prop_name = _group_name(property_codes, prop_name, prop_code)
+                    properties[prop_name].append(item)
+                    if prop_code:
+                        property_codes[prop_name] = prop_code
+                else:
+                    grouped["unidentified_property"].append(item)
+            elif report_type != "General Ledger":
+                # GL only goes to Excel, not PDF
+                grouped["unidentified_excel"].append({
+                    "filename": filename,
+                    "property_code": prop_code,
+                    "report_type": report_type
+                })
+            continue
+
+        if prop_name:
+            # Normalize property name - use property code to group if we have it
+            if prop_code:
+                prop_name = _group_name(property_codes, prop_name, prop_code)
+            properties[prop_name].append(item)
+            if prop_code:
+                property_codes[prop_name] = prop_code
+        else:
+            grouped["unidentified_property"].append(item)
+
+    return grouped
+
+
+def expected_reports(prop_code):
+    """Report types a complete package has for this property."""
+    if prop_code in PROPERTIES_WITH_EXCEL:
+        return BASE_EXPECTED_REPORTS | {"General Ledger"}
+    return BASE_EXPECTED_REPORTS
+
+
+def found_reports(files, prop_code, excel_data=None):
+    """Report types present for a property, counting Excel uploads for special properties."""
+    found = {item["report_type"] for item in files if item["report_type"] != "Unknown"}
+    if prop_code in PROPERTIES_WITH_EXCEL and excel_data:
+        for key, report_type in EXCEL_PACKAGE_REPORTS.items():
+            if key in excel_data:
+                found.add(report_type)
+    return found
@@ -0,0 +1,386 @@
+"""Postgres-backed job queue for Merge & Upload runs.
+
+The app enqueues one job per property (input files go into job_files,
+stored once by SHA-1) and returns immediately; worker processes started with
+``python -m arcan worker`` claim jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+so any number of them can drain the queue without handing out a job twice.
+A worker builds the package, uploads it to Box as the user who started the
+run and stores the package in job_outputs for the UI's download buttons.
+
+Workers send a heartbeat while a job runs. A job whose worker died is put
+back in the queue after JOB_STALE_AFTER seconds; each claim bumps attempts,
+which doubles as a fencing token so a worker that was presumed dead can't
+overwrite the result of the one that took over.
+"""
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+import uuid
+
+from arcan import db
+from arcan.config import (
+    JOB_HEARTBEAT_INTERVAL,
+    JOB_MAX_ATTEMPTS,
+    JOB_POLL_INTERVAL,
+    JOB_PURGE_INTERVAL,
+    JOB_RETENTION_DAYS,
+    JOB_STALE_AFTER,
+    JOB_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Job statuses after which a job won't change again
+FINISHED = ("done", "failed")
+
+
+def enqueue_run(box_user_id, properties, property_codes, excel_files, month_number, year, force=False):
+    """Queue one job per property and return the run ID.
+
+    Arguments are group_uploads() output for the properties to build. Unless
+    force is set, properties whose packages are unchanged in Box are skipped
+    (see arcan.manifest).
+    """
+    run_id = uuid.uuid4().hex
+    files = {}
+
+    def file_ref(item):
+        sha1 = hashlib.sha1(item["bytes"]).hexdigest()
+        files[sha1] = item["bytes"]
+        return sha1
+
+    jobs = []
+    for prop_name, items in sorted(properties.items()):
+        prop_code = property_codes.get(prop_name, "")
+        payload = {
+            "month": month_number,
+            "year": year,
+            "prop_code": prop_code,
+            "force": force,
+            "files": [{"filename": item["filename"], "sha1": file_ref(item), "order": item["order"],
+                       "report_type": item["report_type"]} for item in items],
+            "excel": {key: {"filename": entry["filename"], "sha1": file_ref(entry)}
+                      for key, entry in excel_files.get(prop_code, {}).items()},
+        }
+        jobs.append((run_id, box_user_id, prop_name, json.dumps(payload)))
+
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            # Sorted, so concurrent runs sharing files lock rows in the same order
+            cur.executemany("""
+                INSERT INTO job_files (sha1, content) VALUES (%s, %s)
+                ON CONFLICT (sha1) DO UPDATE SET created_at = now()
+            """, sorted(files.items()))
+            cur.executemany("""
+                INSERT INTO jobs (run_id, box_user_id, property, payload) VALUES (%s, %s, %s, %s::jsonb)
+            """, jobs)
+    return run_id
+
+
+def claim_job(worker, run_id=None):
+    """Mark the oldest queued job (of run_id, if given) running for this worker and return it, or None."""
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE jobs SET status = 'running', attempts = attempts + 1, worker = %s,
+                                started_at = now(), heartbeat_at = now()
+                WHERE id = (SELECT id FROM jobs WHERE status = 'queued' AND (%s IS NULL OR run_id = %s)
+                            ORDER BY id FOR UPDATE SKIP LOCKED LIMIT 1)
+                RETURNING id, run_id, box_user_id, property, payload, attempts
+            """, (worker, run_id, run_id))
+            row = cur.fetchone()
+    if row is None:
+        return None
+    return {"id": row[0], "run_id": row[1], "box_user_id": row[2], "property": row[3],
+            "payload": row[4], "attempt": row[5]}
+
+
+def heartbeat(job_id, attempt):
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("UPDATE jobs SET heartbeat_at = now() WHERE id = %s AND attempts = %s AND status = 'running'",
+                        (job_id, attempt))
+
+
+def worker_seen(worker):
+    """Record that a worker is alive and polling."""
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO job_workers (name, seen_at) VALUES (%s, now())
+                ON CONFLICT (name) DO UPDATE SET seen_at = now()
+            """, (worker,))
+
+
+def live_workers(within=JOB_STALE_AFTER):
+    """Number of workers that checked in during the last `within` seconds."""
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT count(*) FROM job_workers WHERE seen_at > now() - make_interval(secs => %s)",
+                        (within,))
+            return cur.fetchone()[0]
+
+
+def requeue_stale(stale_after=JOB_STALE_AFTER, max_attempts=JOB_MAX_ATTEMPTS):
+    """Requeue running jobs whose worker went quiet; fail them after max_attempts."""
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE jobs SET
+                    status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'queued' END,
+                    error = CASE WHEN attempts >= %s THEN 'Worker stopped responding' ELSE error END,
+                    finished_at = CASE WHEN attempts >= %s THEN now() ELSE NULL END
+                WHERE status = 'running' AND heartbeat_at < now() - make_interval(secs => %s)
+            """, (max_attempts, max_attempts, max_attempts, stale_after))
+            return cur.rowcount
+
+
+def complete_job(job_id, attempt, result, outputs):
+    """Store a finished job's result and packages ([(kind, filename, bytes)]).
+
+    Returns False if the job was taken over by another worker meanwhile.
+    """
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE jobs SET status = 'done', result = %s::jsonb, error = NULL, finished_at = now()
+                WHERE id = %s AND attempts = %s AND status = 'running'
+            """, (json.dumps(result), job_id, attempt))
+            if cur.rowcount == 0:
+                return False
+            cur.executemany("""
+                INSERT INTO job_outputs (job_id, kind, filename, content) VALUES (%s, %s, %s, %s)
+                ON CONFLICT (job_id, kind) DO UPDATE SET filename = EXCLUDED.filename, content = EXCLUDED.content
+            """, [(job_id, kind, filename, data) for kind, filename, data in outputs])
+    return True
+
+
+def fail_job(job_id, attempt, error):
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                UPDATE jobs SET status = 'failed', error = %s, finished_at = now()
+                WHERE id = %s AND attempts = %s AND status = 'running'
+            """, (error, job_id, attempt))
+
+
+def run_status(run_id):
+    """The run's jobs in property order: id, property, status, error, result."""
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT id, property, status, error, result FROM jobs WHERE run_id = %s ORDER BY id",
+                        (run_id,))
+            rows = cur.fetchall()
+    return [{"id": row[0], "property": row[1], "status": row[2], "error": row[3], "result": row[4]}
+            for row in rows]
+
+
+def fetch_output(job_id, kind):
+    """A stored package's bytes, or None."""
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT content FROM job_outputs WHERE job_id = %s AND kind = %s", (job_id, kind))
+            row = cur.fetchone()
+    return bytes(row[0]) if row else None
+
+
+def load_files(sha1s):
+    """{sha1: bytes} for the given job_files."""
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT sha1, content FROM job_files WHERE sha1 = ANY(%s)", (list(sha1s),))
+            return {row[0]: bytes(row[1]) for row in cur.fetchall()}
+
+
+def purge_jobs(retention_days=JOB_RETENTION_DAYS):
+    """Delete finished jobs (and their packages) and input files older than retention_days."""
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM jobs WHERE status IN ('done', 'failed')
+                    AND finished_at < now() - make_interval(days => %s)
+            """, (retention_days,))
+            cur.execute("DELETE FROM job_workers WHERE seen_at < now() - make_interval(days => %s)",
+                        (retention_days,))
+            # A file's created_at is bumped whenever a run references it again
+            cur.execute("""
+                DELETE FROM job_files f WHERE created_at < now() - make_interval(days => %s)
+                    AND NOT EXISTS (SELECT 1 FROM jobs WHERE status IN ('queued', 'running')
+                                    AND created_at >= f.created_at)
+            """, (retention_days,))
+
+
+def process_job(job, token_manager, resolver):
+    """Build and upload one property's package. Returns (result, outputs)."""
+    from arcan.box import content_sha1, month_folder_name, upload_to_box
+    from arcan.manifest import (
+        manifest_output,
+        package_digest,
+        record_failure,
+        record_package,
+        record_skipped,
+        unchanged_package,
+    )
+    from arcan.merge import build_package
+
+    payload = job["payload"]
+    sha1s = {item["sha1"] for item in payload["files"]} | {entry["sha1"] for entry in payload["excel"].values()}
+    contents = load_files(sha1s)
+    files = [dict(item, bytes=contents[item["sha1"]]) for item in payload["files"]]
+    excel_data = {key: {"filename": entry["filename"], "bytes": contents[entry["sha1"]]}
+                  for key, entry in payload["excel"].items()}
+    history = (job["run_id"], job["box_user_id"], payload["month"], payload["year"], job["property"])
+
+    digest = package_digest(files, excel_data, payload["prop_code"], payload["month"], payload["year"])
+    tokens = token_manager.get(job["box_user_id"])
+    if tokens and not payload.get("force"):
+        entries = unchanged_package(payload["month"], payload["year"], job["property"], digest,
+                                    tokens["access_token"])
+        if entries:
+            record_skipped(*history, entries)
+            result = {"warnings": [], "pdf": None, "excel": None}
+            for kind, entry in entries.items():
+                result[kind] = {"filename": entry["filename"], "status": "success", "unchanged": True,
+                                "folder": month_folder_name(payload["month"]), "folder_id": entry["folder_id"],
+                                "file_id": entry["file_id"]}
+            return result, []
+
+    try:
+        package = build_package(job["property"], files, payload["prop_code"], excel_data,
+                                payload["month"], payload["year"])
+    except Exception as e:
+        record_failure(*history, str(e))
+        raise
+
+    result = {"warnings": package["warnings"], "pdf": None, "excel": None}
+    outputs = []
+    manifest = {}
+    for kind, filename, data in (("pdf", package["pdf_filename"], package["pdf_data"]),
+                                 ("excel", package["excel_filename"], package["excel_data"])):
+        if data is None:
+            continue
+        outputs.append((kind, filename, data))
+        sha1 = content_sha1(data)
+        entry = {"filename": filename, "status": "success"}
+        if kind == "pdf":
+            entry["stats"] = package["pdf_stats"]
+        try:
+            tokens = token_manager.get(job["box_user_id"])
+            if not tokens:
+                raise Exception("No Box tokens found - please reconnect to Box")
+            uploaded, folder_name, folder_id = upload_to_box(tokens["access_token"], data, filename,
+                                                             payload["month"], payload["year"], resolver=resolver,
+                                                             sha1=sha1)
+            entry.update(folder=folder_name, folder_id=folder_id, file_id=None)
+            if isinstance(uploaded, dict) and "entries" in uploaded:
+                entry["file_id"] = uploaded["entries"][0]["id"]
+        except Exception as e:
+            entry.update(status="error", error=str(e))
+        result[kind] = entry
+        manifest[kind] = manifest_output(entry, sha1)
+    record_package(*history, digest, manifest)
+    return result, outputs
+
+
+class _Heartbeat(threading.Thread):
+    """Keeps a claimed job's heartbeat_at current until stopped."""
+
+    def __init__(self, job):
+        super().__init__(daemon=True)
+        self.job = job
+        self.stopped = threading.Event()
+
+    def run(self):
+        while not self.stopped.wait(JOB_HEARTBEAT_INTERVAL):
+            try:
+                heartbeat(self.job["id"], self.job["attempt"])
+                worker_seen(self.job["worker"])
+            except Exception as e:
+                logger.warning("Heartbeat for job %s failed: %s", self.job["id"], e)
+
+
+def run_worker(stop=None, poll_interval=JOB_POLL_INTERVAL):
+    """Claim and process jobs until stop (a threading.Event) is set."""
+    from arcan.box import FolderResolver
+    from arcan.tokens import TokenManager
+
+    stop = stop or threading.Event()
+    name = f"{socket.gethostname()}:{os.getpid()}"
+    token_manager = TokenManager()
+    resolver = FolderResolver()
+    logger.info("Worker %s started", name)
+    idle_polls = 0
+    last_seen = 0.0
+    last_purge = time.monotonic()
+    while not stop.is_set():
+        try:
+            if time.monotonic() - last_seen >= JOB_HEARTBEAT_INTERVAL:
+                worker_seen(name)
+                last_seen = time.monotonic()
+            if idle_polls % 30 == 0:
+                requeue_stale()
+            # serve() purges at startup; long-lived workers keep doing it while idle
+            if idle_polls and time.monotonic() - last_purge >= JOB_PURGE_INTERVAL:
+                last_purge = time.monotonic()
+                purge_jobs()
+            job = claim_job(name)
+        except Exception as e:
+            logger.warning("Could not poll the job queue: %s", e)
+            stop.wait(poll_interval)
+            continue
+        if job is None:
+            idle_polls += 1
+            stop.wait(poll_interval)
+            continue
+
+        idle_polls = 0
+        logger.info("Job %s: %s (attempt %d)", job["id"], job["property"], job["attempt"])
+        beat = _Heartbeat(dict(job, worker=name))
+        beat.start()
+        try:
+            result, outputs = process_job(job, token_manager, resolver)
+            if not complete_job(job["id"], job["attempt"], result, outputs):
+                logger.warning("Job %s was taken over by another worker", job["id"])
+        except Exception as e:
+            logger.exception("Job %s failed", job["id"])
+            fail_job(job["id"], job["attempt"], str(e))
+        finally:
+            beat.stopped.set()
+    logger.info("Worker %s stopped", name)
+
+
+def _worker_process():
+    stop = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(levelname)s %(message)s")
+    run_worker(stop)
+
+
+def serve(workers=JOB_WORKERS):
+    """Run workers in child processes until SIGTERM/SIGINT; each finishes its current job first."""
+    from arcan.migrations import migrate
+
+    migrate()
+    purge_jobs()
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=_worker_process, name=f"worker-{index}")
+                 for index in range(max(1, workers))]
+    for process in processes:
+        process.start()
+
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for process in processes:
+        process.join()
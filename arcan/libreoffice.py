@@ -0,0 +1,437 @@
+"""Excel to PDF conversion through LibreOffice.
+
+A pool of long-lived headless soffice processes, each with its own user
+profile, listens on local UNO sockets so conversions run in parallel and only
+pay for rendering, not for process startup. When the UNO bridge isn't
+available, or a server keeps failing, a worker falls back to a one-shot
+``soffice --convert-to pdf`` subprocess against its own profile.
+"""
+import atexit
+import logging
+import os
+import queue
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from arcan.config import (
+    LIBREOFFICE_CONVERT_TIMEOUT,
+    LIBREOFFICE_POOL_SIZE,
+    LIBREOFFICE_SERVER_ENABLED,
+    LIBREOFFICE_STARTUP_TIMEOUT,
+    LIBREOFFICE_WORK_DIR,
+)
+
+logger = logging.getLogger(__name__)
+
+# LibreOffice paths to try
+SOFFICE_CANDIDATES = [
+    '/Applications/LibreOffice.app/Contents/MacOS/soffice',
+    '/usr/local/bin/soffice',
+    '/usr/bin/soffice',
+    'soffice',
+    'libreoffice'
+]
+
+# Where pyuno lives when it isn't importable from the app's interpreter
+UNO_SEARCH_PATHS = [
+    '/usr/lib/python3/dist-packages',
+    '/usr/lib/libreoffice/program',
+    '/Applications/LibreOffice.app/Contents/Resources',
+]
+
+
+class OfficeError(Exception):
+    """Raised when the LibreOffice server can't start or convert a document."""
+
+
+class OfficeTimeout(OfficeError):
+    """Raised when a conversion exceeds its timeout (the server is killed)."""
+
+
+@lru_cache(maxsize=1)
+def find_soffice():
+    """Locate the soffice binary once per process (no --version probing)."""
+    for path in SOFFICE_CANDIDATES:
+        resolved = path if os.path.isabs(path) else shutil.which(path)
+        if resolved and os.path.isfile(resolved) and os.access(resolved, os.X_OK):
+            return resolved
+    return None
+
+
+@lru_cache(maxsize=1)
+def import_uno():
+    """Import the pyuno bridge, or return None if it isn't installed."""
+    try:
+        import uno
+        return uno
+    except ImportError:
+        pass
+
+    # Append (never prepend) so LibreOffice's paths can't shadow our packages
+    for path in UNO_SEARCH_PATHS:
+        if os.path.isdir(path) and path not in sys.path:
+            sys.path.append(path)
+    try:
+        import uno
+        return uno
+    except ImportError:
+        return None
+
+
+def _property(name, value):
+    """Build a com.sun.star.beans.PropertyValue."""
+    from com.sun.star.beans import PropertyValue
+
+    prop = PropertyValue()
+    prop.Name = name
+    prop.Value = value
+    return prop
+
+
+def _free_port():
+    """Ask the OS for an unused local TCP port."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class OfficeServer:
+    """A headless soffice process accepting UNO connections on a local socket.
+
+    Conversions are serialized per server (LibreOffice can't run two against
+    the same profile). A crashed or hung server is restarted on the next call.
+    """
+
+    def __init__(self, soffice_path, profile_dir=None, work_dir=None):
+        self.soffice_path = soffice_path
+        self._owns_profile = profile_dir is None
+        self.profile_dir = profile_dir or tempfile.mkdtemp(prefix="arcan-lo-profile-")
+        self.work_dir = work_dir
+        self.port = None
+        self.process = None
+        self.restarts = 0
+        self.conversions = 0
+        self._desktop = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Launch soffice and wait until it accepts UNO connections."""
+        self.port = _free_port()
+        self.process = subprocess.Popen([
+            self.soffice_path,
+            '--headless',
+            '--invisible',
+            '--nologo',
+            '--nodefault',
+            '--norestore',
+            '--nolockcheck',
+            f'-env:UserInstallation={Path(self.profile_dir).as_uri()}',
+            f'--accept=socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext',
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+
+        deadline = time.monotonic() + LIBREOFFICE_STARTUP_TIMEOUT
+        while True:
+            if self.process.poll() is not None:
+                raise OfficeError(f"soffice exited during startup (code {self.process.returncode})")
+            try:
+                self._desktop = self._connect()
+                return
+            except Exception as e:
+                if time.monotonic() > deadline:
+                    self._kill()
+                    raise OfficeError(f"soffice did not accept connections: {e}")
+            time.sleep(0.25)
+
+    def _connect(self):
+        """Resolve the remote Desktop service over the UNO socket."""
+        uno = import_uno()
+        local_ctx = uno.getComponentContext()
+        resolver = local_ctx.ServiceManager.createInstanceWithContext(
+            "com.sun.star.bridge.UnoUrlResolver", local_ctx)
+        ctx = resolver.resolve(
+            f"uno:socket,host=127.0.0.1,port={self.port};urp;StarOffice.ComponentContext")
+        return ctx.ServiceManager.createInstanceWithContext("com.sun.star.frame.Desktop", ctx)
+
+    def is_healthy(self):
+        """True if the process is running and answers a UNO call."""
+        if self.process is None or self.process.poll() is not None or self._desktop is None:
+            return False
+        try:
+            self._desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def restart(self):
+        self._kill()
+        self.restarts += 1
+        logger.warning("Restarting LibreOffice server (restart #%d)", self.restarts)
+        self.start()
+
+    def convert(self, excel_bytes, timeout=LIBREOFFICE_CONVERT_TIMEOUT):
+        """Convert workbook bytes to PDF bytes on this server."""
+        with self._lock:
+            if not self.is_healthy():
+                self.restart()
+
+            with tempfile.TemporaryDirectory(prefix="arcan-convert-", dir=self.work_dir) as temp_dir:
+                excel_path = os.path.join(temp_dir, "input.xlsx")
+                pdf_path = os.path.join(temp_dir, "input.pdf")
+                with open(excel_path, 'wb') as f:
+                    f.write(excel_bytes)
+
+                # UNO calls block, so run the conversion on a helper thread and
+                # kill the server if it exceeds the timeout (unblocks the call)
+                errors = []
+
+                def run():
+                    try:
+                        self._convert_file(excel_path, pdf_path)
+                    except Exception as e:
+                        errors.append(e)
+
+                worker = threading.Thread(target=run, daemon=True)
+                worker.start()
+                worker.join(timeout)
+                if worker.is_alive():
+                    self._kill()
+                    raise OfficeTimeout(f"LibreOffice conversion timed out after {timeout:.0f}s")
+                if errors:
+                    raise OfficeError(f"LibreOffice conversion failed: {errors[0]}")
+                if not os.path.exists(pdf_path):
+                    raise OfficeError("PDF output not created")
+
+                self.conversions += 1
+                with open(pdf_path, 'rb') as f:
+                    return f.read()
+
+    def _convert_file(self, excel_path, pdf_path):
+        uno = import_uno()
+        doc = self._desktop.loadComponentFromURL(
+            uno.systemPathToFileUrl(excel_path), "_blank", 0,
+            (_property("Hidden", True), _property("ReadOnly", True)))
+        if doc is None:
+            raise OfficeError("LibreOffice could not open the workbook")
+        try:
+            doc.storeToURL(uno.systemPathToFileUrl(pdf_path),
+                           (_property("FilterName", "calc_pdf_Export"),))
+        finally:
+            doc.close(True)
+
+    def _kill(self):
+        self._desktop = None
+        if self.process is None:
+            return
+        # soffice is a launcher for soffice.bin, so signal the whole process group
+        if self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGTERM)
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                self.process.wait()
+            except ProcessLookupError:
+                pass
+        self.process = None
+
+    def stop(self):
+        """Shut the server down and remove its profile if we created it."""
+        with self._lock:
+            if self._desktop is not None:
+                try:
+                    self._desktop.terminate()
+                except Exception:
+                    pass
+            self._kill()
+            if self._owns_profile:
+                shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+
+def initialize_profile(soffice_path, profile_dir, timeout=LIBREOFFICE_STARTUP_TIMEOUT):
+    """Create a LibreOffice user profile up front so the first conversion doesn't pay for it."""
+    if os.path.isdir(os.path.join(profile_dir, "user")):
+        return
+    subprocess.run([
+        soffice_path,
+        '--headless',
+        '--terminate_after_init',
+        f'-env:UserInstallation={Path(profile_dir).as_uri()}',
+    ], capture_output=True, timeout=timeout)
+
+
+def convert_with_subprocess(excel_bytes, timeout=LIBREOFFICE_CONVERT_TIMEOUT, profile_dir=None,
+                            work_dir=None, soffice_path=None):
+    """Convert Excel to PDF with a one-shot soffice process."""
+    soffice_path = soffice_path or find_soffice()
+    if not soffice_path:
+        raise Exception("LibreOffice not found. Install with: brew install --cask libreoffice")
+
+    # Create temp directory for conversion
+    with tempfile.TemporaryDirectory(dir=work_dir) as temp_dir:
+        # Write Excel to temp file
+        excel_path = os.path.join(temp_dir, "input.xlsx")
+        with open(excel_path, 'wb') as f:
+            f.write(excel_bytes)
+
+        command = [soffice_path, '--headless']
+        if profile_dir:
+            command.append(f'-env:UserInstallation={Path(profile_dir).as_uri()}')
+        command += ['--convert-to', 'pdf', '--outdir', temp_dir, excel_path]
+
+        # Convert to PDF using LibreOffice. Run it in its own process group so a
+        # timeout also kills the soffice.bin child the launcher spawns.
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   start_new_session=True)
+        try:
+            _, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(process.pid, signal.SIGKILL)
+            process.communicate()
+            raise Exception(f"LibreOffice conversion timed out after {timeout:.0f}s")
+
+        if process.returncode != 0:
+            raise Exception(f"LibreOffice conversion failed: {stderr.decode()}")
+
+        # Read the PDF output
+        pdf_path = os.path.join(temp_dir, "input.pdf")
+        if not os.path.exists(pdf_path):
+            raise Exception("PDF output not created")
+
+        with open(pdf_path, 'rb') as f:
+            return f.read()
+
+
+class OfficeWorker:
+    """One pool slot: a private profile and scratch dir, plus a UNO server when available."""
+
+    def __init__(self, soffice_path, root_dir, use_server):
+        self.soffice_path = soffice_path
+        self.profile_dir = os.path.join(root_dir, "profile")
+        # The subprocess fallback can't share a profile with a still-running server
+        self.fallback_profile_dir = os.path.join(root_dir, "fallback-profile")
+        self.scratch_dir = os.path.join(root_dir, "scratch")
+        os.makedirs(self.scratch_dir, exist_ok=True)
+        self.server = OfficeServer(soffice_path, self.profile_dir, self.scratch_dir) if use_server else None
+
+    def start(self):
+        if self.server is not None:
+            try:
+                self.server.start()
+                return
+            except OfficeError as e:
+                logger.warning("LibreOffice server unavailable, using subprocess conversion: %s", e)
+                self.server.stop()
+                self.server = None
+        initialize_profile(self.soffice_path, self.profile_dir)
+
+    def convert(self, excel_bytes, timeout):
+        profile_dir = self.profile_dir
+        if self.server is not None:
+            try:
+                return self.server.convert(excel_bytes, timeout)
+            except OfficeTimeout:
+                # Retrying would double the job's time budget
+                raise
+            except OfficeError as e:
+                logger.warning("LibreOffice server conversion failed, falling back to subprocess: %s", e)
+                profile_dir = self.fallback_profile_dir
+        return convert_with_subprocess(excel_bytes, timeout, profile_dir=profile_dir,
+                                       work_dir=self.scratch_dir, soffice_path=self.soffice_path)
+
+    def stop(self):
+        if self.server is not None:
+            self.server.stop()
+
+
+class ConversionPool:
+    """A fixed set of isolated LibreOffice workers converting in parallel.
+
+    Each worker has its own -env:UserInstallation profile, so conversions on
+    different workers never contend for a profile lock, and a crash or timeout
+    only fails the job that caused it (the worker restarts on its next job).
+    """
+
+    def __init__(self, size=LIBREOFFICE_POOL_SIZE, work_dir=LIBREOFFICE_WORK_DIR, soffice_path=None):
+        self.size = max(1, size)
+        self.soffice_path = soffice_path or find_soffice()
+        self.root_dir = tempfile.mkdtemp(prefix="arcan-lo-", dir=work_dir or None)
+        self.workers = []
+        self._idle = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="soffice")
+
+    def start(self):
+        """Create and warm up every worker in parallel."""
+        use_server = LIBREOFFICE_SERVER_ENABLED and import_uno() is not None
+        self.workers = [
+            OfficeWorker(self.soffice_path, os.path.join(self.root_dir, f"worker-{i}"), use_server)
+            for i in range(self.size)
+        ]
+        for future in [self._executor.submit(worker.start) for worker in self.workers]:
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning("LibreOffice worker warm-up failed: %s", e)
+        for worker in self.workers:
+            self._idle.put(worker)
+
+    def convert(self, excel_bytes, timeout=LIBREOFFICE_CONVERT_TIMEOUT):
+        """Convert on the next free worker (blocks until one is idle)."""
+        worker = self._idle.get()
+        try:
+            return worker.convert(excel_bytes, timeout)
+        finally:
+            self._idle.put(worker)
+
+    def submit(self, excel_bytes, timeout=LIBREOFFICE_CONVERT_TIMEOUT):
+        """Schedule a conversion on the pool and return its Future."""
+        return self._executor.submit(self.convert, excel_bytes, timeout)
+
+    def convert_all(self, workbooks, timeout=LIBREOFFICE_CONVERT_TIMEOUT):
+        """Convert a list of workbooks across the pool.
+
+        Returns a list of (pdf_bytes, error_message) in input order.
+        """
+        futures = [self.submit(excel_bytes, timeout) for excel_bytes in workbooks]
+        results = []
+        for future in futures:
+            try:
+                results.append((future.result(), None))
+            except Exception as e:
+                results.append((None, str(e)))
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        for worker in self.workers:
+            worker.stop()
+        shutil.rmtree(self.root_dir, ignore_errors=True)
+
+
+def start_conversion_pool(size=LIBREOFFICE_POOL_SIZE):
+    """Start a conversion pool, or return None if LibreOffice isn't installed."""
+    if not find_soffice():
+        return None
+    pool = ConversionPool(size)
+    pool.start()
+    atexit.register(pool.shutdown)
+    return pool
+
+
+def excel_to_pdf(excel_bytes, pool=None):
+    """Convert Excel file to PDF using LibreOffice (preserves formatting).
+
+    Uses a worker from the conversion pool when one is given, otherwise a
+    one-shot soffice subprocess.
+    """
+    if pool is not None:
+        return pool.convert(excel_bytes)
+    return convert_with_subprocess(excel_bytes)
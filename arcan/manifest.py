@@ -0,0 +1,146 @@
+"""Package manifest: resumable, idempotent Merge & Upload runs.
+
+For every uploaded package, package_manifest records a digest of the inputs
+it was built from, the SHA-1 of the output and its Box file ID. A later run
+computes the digest of its inputs first; if it matches and Box still reports
+the recorded SHA-1 for that file, the property is skipped without merging or
+uploading. A retry after a partial failure therefore only redoes the
+properties that failed or whose reports changed.
+
+run_history keeps one row per run and property (uploaded, skipped or
+failed). The manifest is an optimisation, so database errors are logged and
+treated as "nothing recorded".
+"""
+import hashlib
+import json
+import logging
+
+from arcan import db
+from arcan.box import file_sha1
+from arcan.config import PDF_LINEARIZE
+
+logger = logging.getLogger(__name__)
+
+# Part of every digest; bump it when a merge change alters package output
+MANIFEST_VERSION = 1
+
+
+def package_digest(files, excel_data, prop_code, month_number, year):
+    """SHA-1 over everything that determines a property's packages."""
+    hasher = hashlib.sha1()
+    hasher.update(json.dumps([MANIFEST_VERSION, PDF_LINEARIZE, prop_code, month_number, year]).encode())
+    for item in sorted(files, key=lambda item: (item["order"], item["filename"])):
+        hasher.update(json.dumps([item["report_type"], item["filename"],
+                                  hashlib.sha1(item["bytes"]).hexdigest()]).encode())
+    for key, entry in sorted((excel_data or {}).items()):
+        hasher.update(json.dumps([key, hashlib.sha1(entry["bytes"]).hexdigest()]).encode())
+    return hasher.hexdigest()
+
+
+def load_entries(month_number, year, prop_name):
+    """{kind: manifest entry} for a property's last upload."""
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT kind, filename, input_digest, output_sha1, box_file_id, box_folder_id
+                FROM package_manifest WHERE month = %s AND year = %s AND property = %s
+            """, (month_number, year, prop_name))
+            rows = cur.fetchall()
+    return {row[0]: {"filename": row[1], "input_digest": row[2], "sha1": row[3], "file_id": row[4],
+                     "folder_id": row[5]} for row in rows}
+
+
+def unchanged_package(month_number, year, prop_name, digest, access_token):
+    """The manifest entries if the property's packages were last built from
+    these exact inputs and are all still in Box unchanged; otherwise None."""
+    try:
+        entries = load_entries(month_number, year, prop_name)
+    except Exception as e:
+        logger.warning("Could not read package manifest: %s", e)
+        return None
+    if not entries or any(entry["input_digest"] != digest for entry in entries.values()):
+        return None
+    for entry in entries.values():
+        if not entry["file_id"] or file_sha1(access_token, entry["file_id"]) != entry["sha1"]:
+            return None
+    return entries
+
+
+def _record_run(cur, run_id, box_user_id, month_number, year, prop_name, status, detail):
+    cur.execute("""
+        INSERT INTO run_history (run_id, property, box_user_id, month, year, status, detail)
+        VALUES (%s, %s, %s, %s, %s, %s, %s::jsonb)
+        ON CONFLICT (run_id, property) DO UPDATE SET
+            status = EXCLUDED.status, detail = EXCLUDED.detail, recorded_at = now()
+    """, (run_id, prop_name, box_user_id, month_number, year, status, json.dumps(detail)))
+
+
+def manifest_output(entry, sha1):
+    """The manifest fields of an upload result entry."""
+    return {"filename": entry["filename"], "sha1": sha1, "status": entry["status"], "error": entry.get("error"),
+            "file_id": entry.get("file_id"), "folder_id": entry.get("folder_id")}
+
+
+def record_package(run_id, box_user_id, month_number, year, prop_name, digest, outputs):
+    """Record a property's upload. outputs is {kind: {"filename", "sha1",
+    "file_id", "folder_id", "status", "error"}}; failed uploads are kept
+    without a file ID so the next run redoes them."""
+    status = "uploaded" if all(output["status"] == "success" for output in outputs.values()) else "failed"
+    try:
+        with db.get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                for kind, output in outputs.items():
+                    cur.execute("""
+                        INSERT INTO package_manifest (month, year, property, kind, filename, input_digest,
+                                                      output_sha1, box_file_id, box_folder_id, run_id)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                        ON CONFLICT (month, year, property, kind) DO UPDATE SET
+                            filename = EXCLUDED.filename, input_digest = EXCLUDED.input_digest,
+                            output_sha1 = EXCLUDED.output_sha1, box_file_id = EXCLUDED.box_file_id,
+                            box_folder_id = EXCLUDED.box_folder_id, run_id = EXCLUDED.run_id,
+                            updated_at = now()
+                    """, (month_number, year, prop_name, kind, output["filename"], digest, output["sha1"],
+                          output.get("file_id") if output["status"] == "success" else None,
+                          output.get("folder_id"), run_id))
+                # Kinds this build didn't produce (e.g. the Excel package) are stale
+                cur.execute("""
+                    DELETE FROM package_manifest WHERE month = %s AND year = %s AND property = %s
+                        AND NOT (kind = ANY(%s))
+                """, (month_number, year, prop_name, list(outputs)))
+                _record_run(cur, run_id, box_user_id, month_number, year, prop_name, status, outputs)
+    except Exception as e:
+        logger.warning("Could not update package manifest: %s", e)
+
+
+def record_skipped(run_id, box_user_id, month_number, year, prop_name, entries):
+    _record(run_id, box_user_id, month_number, year, prop_name, "skipped", entries)
+
+
+def record_failure(run_id, box_user_id, month_number, year, prop_name, error):
+    _record(run_id, box_user_id, month_number, year, prop_name, "failed", {"error": error})
+
+
+def _record(run_id, box_user_id, month_number, year, prop_name, status, detail):
+    try:
+        with db.get_pool().connection() as conn:
+            with conn.cursor() as cur:
+                _record_run(cur, run_id, box_user_id, month_number, year, prop_name, status, detail)
+    except Exception as e:
+        logger.warning("Could not update run history: %s", e)
+
+
+def recent_runs(limit=10):
+    """The latest runs with per-status property counts, newest first."""
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                SELECT run_id, month, year, MAX(recorded_at),
+                       COUNT(*) FILTER (WHERE status = 'uploaded'),
+                       COUNT(*) FILTER (WHERE status = 'skipped'),
+                       COUNT(*) FILTER (WHERE status = 'failed')
+                FROM run_history GROUP BY run_id, month, year
+                ORDER BY MAX(recorded_at) DESC LIMIT %s
+            """, (limit,))
+            rows = cur.fetchall()
+    return [{"run_id": row[0], "month": row[1], "year": row[2], "finished_at": row[3],
+             "uploaded": row[4], "skipped": row[5], "failed": row[6]} for row in rows]
@@ -0,0 +1,323 @@
+"""Merge stage: build each property's PDF package and merged Excel workbook."""
+import io
+import logging
+import shutil
+import tempfile
+from copy import copy
+
+from arcan.config import ARTIFACT_SPOOL_MAX, EXCEL_STREAMING_BYTES, EXCEL_STREAMING_ROWS, PDF_LINEARIZE
+from arcan.intake import PROPERTIES_WITH_EXCEL
+from arcan.pdf import PdfPackageWriter, linearize
+from arcan.xlsx import sheet_layout, sheet_stats, splice_sheets
+
+logger = logging.getLogger(__name__)
+
+
+def merge_pdfs(pdf_files, output):
+    """Merge report PDFs (already in report order) into one package.
+
+    Pages are written to output (a writable binary file) one report at a
+    time, with fonts and images shared between reports stored once and a
+    bookmark per report (see arcan.pdf). With PDF_LINEARIZE the package is
+    then linearized for fast web view. Returns the writer stats: input/output
+    bytes, shared objects and whether it was linearized.
+    """
+    if not PDF_LINEARIZE:
+        stats = write_pdf_package(pdf_files, output)
+    else:
+        with tempfile.SpooledTemporaryFile(max_size=ARTIFACT_SPOOL_MAX) as merged:
+            stats = write_pdf_package(pdf_files, merged)
+            start = output.tell()
+            if linearize(merged, output):
+                stats["linearized"] = True
+                stats["output_bytes"] = output.tell() - start
+            else:
+                merged.seek(0)
+                shutil.copyfileobj(merged, output)
+    logger.info("Merged %d PDFs: %d -> %d bytes, %d shared objects (%d bytes) written once",
+                stats["inputs"], stats["input_bytes"], stats["output_bytes"],
+                stats["shared_objects"], stats["shared_bytes"])
+    return stats
+
+
+def write_pdf_package(pdf_files, output):
+    """Write the merged, bookmarked (not linearized) package to output."""
+    writer = PdfPackageWriter(output)
+    for item in pdf_files:
+        writer.add(item["bytes"], title=item["report_type"])
+    writer.close()
+    return dict(writer.stats, linearized=False)
+
+
+def merge_excel_files(t12_bytes, ytd_bytes, gl_bytes):
+    """Merge three Excel files into one workbook with 3 sheets, preserving exact format.
+
+    The YTD and GL worksheets are spliced into the T-12 package at the zip
+    level (see arcan.xlsx). Workbooks the splicer can't handle are merged by
+    copying cells with openpyxl instead, streaming if any sheet is large.
+    """
+    sheets = [(data, title) for data, title in ((ytd_bytes, "YTD Statement"), (gl_bytes, "General Ledger")) if data]
+    try:
+        return splice_sheets(t12_bytes, "T-12 Statement", sheets)
+    except Exception as e:
+        logger.warning("Sheet splicing failed, copying cells instead: %s", e)
+    if any(is_large_workbook(data) for data in (t12_bytes, ytd_bytes, gl_bytes) if data):
+        return merge_excel_files_streaming(t12_bytes, ytd_bytes, gl_bytes)
+    return merge_excel_files_openpyxl(t12_bytes, ytd_bytes, gl_bytes)
+
+
+def is_large_workbook(data):
+    """True if the active sheet is over EXCEL_STREAMING_ROWS rows or EXCEL_STREAMING_BYTES of XML."""
+    try:
+        rows, size = sheet_stats(data)
+    except Exception:
+        # Can't tell (e.g. not a zip) - the in-memory path reports the error
+        return False
+    return (rows or 0) > EXCEL_STREAMING_ROWS or size > EXCEL_STREAMING_BYTES
+
+
+class StyleInterner:
+    """Copies each distinct source cell style into the target workbook once.
+
+    A cell's _style is a StyleArray of indexes into its workbook's font,
+    fill, border, number format, protection and alignment tables, so equal
+    arrays mean equal styles. The first cell with a given array gets real
+    copies of the style objects; every later one just gets the resulting
+    target StyleArray. Ledgers use a handful of styles across thousands of
+    cells, so this skips nearly all the copying and the dedupe openpyxl
+    would otherwise repeat for every assignment.
+
+    Keys are only meaningful within one source workbook: use one interner
+    per source.
+    """
+
+    def __init__(self):
+        self._styles = {}
+        self.hits = 0
+        self.misses = 0
+
+    def apply(self, cell, new_cell):
+        # Read-only cells keep their StyleArray in the workbook, not the cell
+        key = tuple(cell.style_array if hasattr(cell, "style_array") else cell._style)
+        style = self._styles.get(key)
+        if style is None:
+            self.misses += 1
+            new_cell.font = copy(cell.font)
+            new_cell.border = copy(cell.border)
+            new_cell.fill = copy(cell.fill)
+            new_cell.number_format = cell.number_format
+            new_cell.protection = copy(cell.protection)
+            new_cell.alignment = copy(cell.alignment)
+            self._styles[key] = copy(new_cell._style)
+        else:
+            self.hits += 1
+            # Each cell owns its StyleArray (openpyxl mutates it in place)
+            new_cell._style = copy(style)
+
+
+def copy_sheet(source_ws, ws, interner=None):
+    """Copy cells, styles, merged ranges, dimensions, freeze panes and page
+    setup from source_ws into the (empty) worksheet ws of another workbook."""
+    from openpyxl.cell.cell import MergedCell
+
+    if interner is None:
+        interner = StyleInterner()
+
+    # Copy sheet properties
+    ws.sheet_format = copy(source_ws.sheet_format)
+    ws.sheet_properties = copy(source_ws.sheet_properties)
+
+    # Copy all cells BEFORE merging
+    for row in source_ws.iter_rows():
+        for cell in row:
+            if isinstance(cell, MergedCell):
+                continue
+            new_cell = ws.cell(row=cell.row, column=cell.column)
+            new_cell.value = cell.value
+            if cell.has_style:
+                interner.apply(cell, new_cell)
+
+    # Apply merged cells
+    for merged_range in list(source_ws.merged_cells.ranges):
+        ws.merge_cells(str(merged_range))
+
+    # Copy column dimensions
+    for key, dim in source_ws.column_dimensions.items():
+        ws.column_dimensions[key] = copy(dim)
+
+    # Copy row dimensions
+    for key, dim in source_ws.row_dimensions.items():
+        ws.row_dimensions[key] = copy(dim)
+
+    # Copy freeze panes
+    ws.freeze_panes = source_ws.freeze_panes
+
+    # Copy page setup
+    ws.page_margins = copy(source_ws.page_margins)
+    ws.page_setup = copy(source_ws.page_setup)
+
+
+def merge_excel_files_openpyxl(t12_bytes, ytd_bytes, gl_bytes):
+    """Merge by loading every workbook in openpyxl and copying cells one by one."""
+    from openpyxl import load_workbook
+    import zipfile
+
+    # Start with T-12 as base - load it directly to preserve exact formatting
+    output = io.BytesIO()
+
+    with zipfile.ZipFile(io.BytesIO(t12_bytes), 'r') as t12_zip:
+        with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as out_zip:
+            for item in t12_zip.namelist():
+                data = t12_zip.read(item)
+                if item == 'xl/workbook.xml':
+                    data = data.replace(b'Sheet1', b'T-12 Statement')
+                    data = data.replace(b'Sheet 1', b'T-12 Statement')
+                out_zip.writestr(item, data)
+
+    output.seek(0)
+    wb = load_workbook(output)
+    wb.active.title = "T-12 Statement"
+
+    def add_sheet_full_copy(source_bytes, sheet_name):
+        """Add sheet with comprehensive formatting copy."""
+        try:
+            source_wb = load_workbook(io.BytesIO(source_bytes))
+            ws = wb.create_sheet(sheet_name)
+            copy_sheet(source_wb.active, ws)
+            source_wb.close()
+        except Exception as e:
+            if sheet_name not in wb.sheetnames:
+                ws = wb.create_sheet(sheet_name)
+            ws.cell(row=1, column=1, value=f"Error: {str(e)}")
+
+    if ytd_bytes:
+        add_sheet_full_copy(ytd_bytes, "YTD Statement")
+    if gl_bytes:
+        add_sheet_full_copy(gl_bytes, "General Ledger")
+
+    # Save final output
+    final_output = io.BytesIO()
+    wb.save(final_output)
+    final_output.seek(0)
+    return final_output.getvalue()
+
+
+def stream_sheet(source_bytes, ws):
+    """Copy a workbook's active sheet into a write-only worksheet row by row.
+
+    The source is read with read_only=True, so only the current row is in
+    memory on either side. Cell values and styles, merged ranges, column
+    widths and the frozen pane are kept; row heights and page setup are not
+    available from a read-only sheet.
+    """
+    from openpyxl import load_workbook
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.utils import get_column_letter
+    from openpyxl.worksheet.dimensions import ColumnDimension
+
+    # Layout first: a write-only sheet writes its header before any row
+    layout = sheet_layout(source_bytes)
+    for col in layout["cols"]:
+        letter = get_column_letter(col["min"])
+        ws.column_dimensions[letter] = ColumnDimension(ws, index=letter, min=col["min"], max=col["max"],
+                                                       width=col["width"], hidden=col["hidden"])
+    if layout["freeze"]:
+        ws.freeze_panes = layout["freeze"]
+
+    source_wb = load_workbook(io.BytesIO(source_bytes), read_only=True)
+    try:
+        interner = StyleInterner()
+        for row in source_wb.active.iter_rows():
+            cells = []
+            for cell in row:
+                # Padding cells (EmptyCell) have no style at all
+                if cell.value is None and not getattr(cell, "has_style", False):
+                    cells.append(None)
+                    continue
+                new_cell = WriteOnlyCell(ws, value=cell.value)
+                if cell.has_style:
+                    interner.apply(cell, new_cell)
+                cells.append(new_cell)
+            ws.append(cells)
+    finally:
+        source_wb.close()
+
+    for merged_range in layout["merged"]:
+        ws.merged_cells.add(merged_range)
+
+
+def merge_excel_files_streaming(t12_bytes, ytd_bytes, gl_bytes):
+    """Merge into a write-only workbook; memory stays bounded by one row."""
+    from openpyxl import Workbook
+
+    wb = Workbook(write_only=True)
+    for data, title in ((t12_bytes, "T-12 Statement"), (ytd_bytes, "YTD Statement"), (gl_bytes, "General Ledger")):
+        if not data:
+            continue
+        ws = wb.create_sheet(title)
+        try:
+            stream_sheet(data, ws)
+        except Exception as e:
+            ws.append([f"Error: {str(e)}"])
+
+    output = io.BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+
+def build_package(prop_name, files, prop_code, excel_data_for_prop, month_number, year,
+                  store=None, session_id=None):
+    """Do the CPU-bound work for one property: merge its PDFs and, for
+    properties with Excel reports, its T-12/YTD/GL workbooks.
+
+    Returns a dict with the package filenames and bytes, the PDF merge
+    stats, plus any warnings for the UI. Given an ArtifactStore, the packages are written into it and
+    pdf_data/excel_data hold artifact IDs instead of bytes.
+    """
+    # Sort files by report order
+    files = sorted(files, key=lambda x: x["order"])
+
+    # Merge PDFs (exclude General Ledger)
+    pdf_files = [item for item in files if item["report_type"] != "General Ledger"]
+
+    package = {
+        "property": prop_name,
+        # Generate filename: "{Property Name} Financials {MM} {YYYY}.pdf"
+        "pdf_filename": f"{prop_name} Financials {month_number} {year}.pdf",
+        "pdf_data": None,
+        "pdf_stats": None,
+        "excel_filename": None,
+        "excel_data": None,
+        "warnings": [],
+    }
+    if store is not None:
+        with store.writer(session_id, package["pdf_filename"]) as output:
+            package["pdf_stats"] = merge_pdfs(pdf_files, output)
+        package["pdf_data"] = output.artifact_id
+    else:
+        output = io.BytesIO()
+        package["pdf_stats"] = merge_pdfs(pdf_files, output)
+        package["pdf_data"] = output.getvalue()
+
+    # Create merged Excel for special properties (from uploaded Excel files)
+    needs_excel = prop_code in PROPERTIES_WITH_EXCEL
+    if needs_excel and excel_data_for_prop:
+        t12_excel = excel_data_for_prop.get("T-12", {}).get("bytes")
+        ytd_excel = excel_data_for_prop.get("YTD", {}).get("bytes")
+        gl_excel = excel_data_for_prop.get("GL", {}).get("bytes")
+
+        if t12_excel and ytd_excel and gl_excel:
+            package["excel_filename"] = f"{prop_name} Financials {month_number} {year}.xlsx"
+            package["excel_data"] = merge_excel_files(t12_excel, ytd_excel, gl_excel)
+            if store is not None:
+                package["excel_data"] = store.put(session_id, package["excel_filename"], package["excel_data"])
+        else:
+            missing = []
+            if not t12_excel: missing.append("T-12")
+            if not ytd_excel: missing.append("YTD")
+            if not gl_excel: missing.append("General Ledger")
+            package["warnings"].append(f"Could not create Excel for {prop_name}: missing Excel files for {', '.join(missing)}")
+    elif needs_excel:
+        package["warnings"].append(f"No Excel files uploaded for {prop_name}")
+
+    return package
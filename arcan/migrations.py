@@ -0,0 +1,162 @@
+"""Versioned Postgres schema migrations.
+
+Each migration is (version, description, statements) and runs once, in
+order, inside a single transaction; the highest applied version is recorded
+in schema_version. New tables and columns are added by appending a migration
+here - never by editing one that has already shipped.
+"""
+import logging
+
+from arcan import db
+
+logger = logging.getLogger(__name__)
+
+# Arbitrary key for the advisory lock that stops two processes migrating at once
+MIGRATION_LOCK_ID = 7241001
+
+MIGRATIONS = [
+    (1, "Box tokens keyed by Box user", [
+        # Tokens used to be keyed by a local username; that table can't be migrated
+        """
+        DO $$ BEGIN
+            IF EXISTS (SELECT 1 FROM information_schema.columns
+                       WHERE table_name = 'box_tokens' AND column_name = 'username') THEN
+                DROP TABLE box_tokens;
+            END IF;
+        END $$
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS box_tokens (
+            box_user_id VARCHAR(100) PRIMARY KEY,
+            box_user_name VARCHAR(255),
+            box_user_email VARCHAR(255),
+            access_token TEXT,
+            refresh_token TEXT
+        )
+        """,
+    ]),
+    (2, "Box folder index", [
+        # Box folder IDs by (parent folder, name) so uploads don't re-list folders
+        """
+        CREATE TABLE IF NOT EXISTS box_folders (
+            parent_id VARCHAR(100),
+            name VARCHAR(255),
+            folder_id VARCHAR(100),
+            PRIMARY KEY (parent_id, name)
+        )
+        """,
+    ]),
+    (3, "Access token expiry", [
+        "ALTER TABLE box_tokens ADD COLUMN IF NOT EXISTS expires_at TIMESTAMPTZ",
+    ]),
+    (4, "Merge & Upload job queue", [
+        # Report files referenced by queued jobs, stored once by content
+        """
+        CREATE TABLE IF NOT EXISTS job_files (
+            sha1 CHAR(40) PRIMARY KEY,
+            content BYTEA NOT NULL,
+            created_at TIMESTAMPTZ DEFAULT now()
+        )
+        """,
+        # One job per property of a run; workers claim them with SKIP LOCKED
+        """
+        CREATE TABLE IF NOT EXISTS jobs (
+            id BIGSERIAL PRIMARY KEY,
+            run_id VARCHAR(32) NOT NULL,
+            box_user_id VARCHAR(100) NOT NULL,
+            property VARCHAR(255) NOT NULL,
+            payload JSONB NOT NULL,
+            status VARCHAR(16) NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker VARCHAR(255),
+            error TEXT,
+            result JSONB,
+            created_at TIMESTAMPTZ DEFAULT now(),
+            started_at TIMESTAMPTZ,
+            heartbeat_at TIMESTAMPTZ,
+            finished_at TIMESTAMPTZ
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS jobs_queued ON jobs (id) WHERE status = 'queued'",
+        "CREATE INDEX IF NOT EXISTS jobs_run ON jobs (run_id)",
+        # Built packages, for the UI's download buttons
+        """
+        CREATE TABLE IF NOT EXISTS job_outputs (
+            job_id BIGINT REFERENCES jobs (id) ON DELETE CASCADE,
+            kind VARCHAR(8),
+            filename VARCHAR(255),
+            content BYTEA,
+            PRIMARY KEY (job_id, kind)
+        )
+        """,
+    ]),
+    (5, "Package manifest and run history", [
+        # Last upload of each package: what it was built from and where it is in Box
+        """
+        CREATE TABLE IF NOT EXISTS package_manifest (
+            month CHAR(2),
+            year VARCHAR(4),
+            property VARCHAR(255),
+            kind VARCHAR(8),
+            filename VARCHAR(255),
+            input_digest CHAR(40),
+            output_sha1 CHAR(40),
+            box_file_id VARCHAR(100),
+            box_folder_id VARCHAR(100),
+            run_id VARCHAR(32),
+            updated_at TIMESTAMPTZ DEFAULT now(),
+            PRIMARY KEY (month, year, property, kind)
+        )
+        """,
+        # What each run did per property (uploaded, skipped or failed)
+        """
+        CREATE TABLE IF NOT EXISTS run_history (
+            run_id VARCHAR(32),
+            property VARCHAR(255),
+            box_user_id VARCHAR(100),
+            month CHAR(2),
+            year VARCHAR(4),
+            status VARCHAR(16),
+            detail JSONB,
+            recorded_at TIMESTAMPTZ DEFAULT now(),
+            PRIMARY KEY (run_id, property)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS run_history_period ON run_history (year, month, recorded_at)",
+    ]),
+    (6, "Job worker liveness", [
+        # Workers check in while polling, so the app can tell when none is running
+        """
+        CREATE TABLE IF NOT EXISTS job_workers (
+            name VARCHAR(255) PRIMARY KEY,
+            seen_at TIMESTAMPTZ DEFAULT now()
+        )
+        """,
+    ]),
+]
+
+
+def migrate(migrations=MIGRATIONS):
+    """Apply pending migrations and return the resulting schema version."""
+    with db.get_pool().connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TIMESTAMPTZ DEFAULT now()
+                )
+            """)
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+            current = cur.fetchone()[0]
+            for version, description, statements in migrations:
+                if version <= current:
+                    continue
+                logger.info("Applying schema migration %d: %s", version, description)
+                for statement in statements:
+                    cur.execute(statement)
+                cur.execute("INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                            (version, description))
+                current = version
+    return current
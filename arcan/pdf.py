@@ -0,0 +1,280 @@
+"""Streaming PDF package writer.
+
+PdfMerger keeps every appended document in memory and serialises the whole
+package at the end. PdfPackageWriter copies each input's pages to the output
+as it goes instead: objects are written as soon as they are copied, so only
+the current input is held in memory, and the page tree, catalog and
+cross-reference table follow once all inputs are in.
+
+The Yardi reports in a package embed the same fonts and logo. Streams (font
+programs, images, form XObjects) and font dictionaries are keyed by a hash
+of their serialised form, with references already renumbered, so an
+identical object from a later input points at the copy already written
+instead of being written again. Source outlines and form fields are not
+carried over; instead each input can be given a title, and the package gets
+a one-level outline with a bookmark at each input's first page.
+
+linearize() rewrites a finished package for fast web view with qpdf (through
+pikepdf), so Box's previewer can render page 1 before the rest arrives.
+Output is deterministic: the same inputs give the same bytes (and SHA-1).
+"""
+import hashlib
+import io
+import logging
+import shutil
+import tempfile
+
+from arcan.config import ARTIFACT_SPOOL_MAX
+
+logger = logging.getLogger(__name__)
+
+_HEADER = b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n"
+
+# Dictionaries that are safe to share between pages and inputs (annotations,
+# for example, must belong to a single page)
+_SHAREABLE_TYPES = ("/Font", "/FontDescriptor", "/Encoding", "/ExtGState")
+
+
+class PdfPackageWriter:
+    """Append PDFs page by page to a writable binary file.
+
+    Call add() for each input in order, then close() to write the page tree
+    and trailer. stats has the input and output byte counts and how many
+    objects were written once and shared.
+    """
+
+    def __init__(self, output):
+        from PyPDF2 import generic
+
+        self._generic = generic
+        self._output = output
+        self._position = 0
+        self._offsets = {}
+        self._next_number = 1
+        self._shared = {}
+        self._pages = []
+        self._bookmarks = []
+        # Source (idnum, generation) -> output object number, per input
+        self._numbers = None
+        self._in_progress = set()
+        self._pages_root = self._reserve()
+        self.stats = {"inputs": 0, "pages": 0, "input_bytes": 0, "output_bytes": 0,
+                      "objects": 0, "shared_objects": 0, "shared_bytes": 0}
+        self._write(_HEADER)
+
+    def add(self, data, title=None):
+        """Copy every page of a PDF (bytes) to the output, bookmarked as title."""
+        from PyPDF2 import PdfReader
+
+        reader = PdfReader(io.BytesIO(data))
+        pages = list(reader.pages)
+        if title and pages:
+            self._bookmarks.append((title, len(self._pages)))
+        self._numbers = {}
+        # Number all pages up front so links between them resolve
+        numbers = []
+        for page in pages:
+            number = self._reserve()
+            self._numbers[self._key(page.indirect_reference)] = number
+            numbers.append(number)
+        for page, number in zip(pages, numbers):
+            copied = self._generic.DictionaryObject()
+            for key, value in page.items():
+                if key != "/Parent":
+                    copied[key] = self._copy(value)
+            copied[self._generic.NameObject("/Parent")] = self._ref(self._pages_root)
+            self._write_object(number, self._serialize(copied))
+        self._pages.extend(numbers)
+        self._numbers = None
+
+        self.stats["inputs"] += 1
+        self.stats["pages"] += len(pages)
+        self.stats["input_bytes"] += len(data)
+
+    def close(self):
+        """Write the page tree, catalog and cross-reference table."""
+        g = self._generic
+        pages_root = g.DictionaryObject({
+            g.NameObject("/Type"): g.NameObject("/Pages"),
+            g.NameObject("/Kids"): g.ArrayObject(self._ref(number) for number in self._pages),
+            g.NameObject("/Count"): g.NumberObject(len(self._pages)),
+        })
+        self._write_object(self._pages_root, self._serialize(pages_root))
+        catalog = g.DictionaryObject({
+            g.NameObject("/Type"): g.NameObject("/Catalog"),
+            g.NameObject("/Pages"): self._ref(self._pages_root),
+        })
+        if self._bookmarks:
+            catalog[g.NameObject("/Outlines")] = self._write_outline()
+            catalog[g.NameObject("/PageMode")] = g.NameObject("/UseOutlines")
+        catalog_number = self._reserve()
+        self._write_object(catalog_number, self._serialize(catalog))
+
+        xref = self._position
+        lines = [b"xref\n0 %d\n" % self._next_number, b"0000000000 65535 f \n"]
+        for number in range(1, self._next_number):
+            offset = self._offsets.get(number)
+            lines.append(b"%010d 00000 n \n" % offset if offset is not None else b"0000000000 65535 f \n")
+        self._write(b"".join(lines))
+        self._write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                    % (self._next_number, catalog_number, xref))
+        self.stats["output_bytes"] = self._position
+
+    def _write_outline(self):
+        """Write the outline root and one item per bookmark; returns the root reference."""
+        g = self._generic
+        root = self._reserve()
+        items = [self._reserve() for _ in self._bookmarks]
+        for index, ((title, page_index), number) in enumerate(zip(self._bookmarks, items)):
+            item = g.DictionaryObject({
+                g.NameObject("/Title"): g.create_string_object(title),
+                g.NameObject("/Parent"): self._ref(root),
+                g.NameObject("/Dest"): g.ArrayObject([self._ref(self._pages[page_index]), g.NameObject("/Fit")]),
+            })
+            if index > 0:
+                item[g.NameObject("/Prev")] = self._ref(items[index - 1])
+            if index < len(items) - 1:
+                item[g.NameObject("/Next")] = self._ref(items[index + 1])
+            self._write_object(number, self._serialize(item))
+        outline = g.DictionaryObject({
+            g.NameObject("/Type"): g.NameObject("/Outlines"),
+            g.NameObject("/First"): self._ref(items[0]),
+            g.NameObject("/Last"): self._ref(items[-1]),
+            g.NameObject("/Count"): g.NumberObject(len(items)),
+        })
+        self._write_object(root, self._serialize(outline))
+        return self._ref(root)
+
+    def _reserve(self):
+        number = self._next_number
+        self._next_number += 1
+        return number
+
+    def _ref(self, number):
+        return self._generic.IndirectObject(number, 0, self)
+
+    @staticmethod
+    def _key(ref):
+        return ref.idnum, ref.generation
+
+    def _write(self, data):
+        self._output.write(data)
+        self._position += len(data)
+
+    def _write_object(self, number, body):
+        self._offsets[number] = self._position
+        self._write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+        self.stats["objects"] += 1
+
+    @staticmethod
+    def _serialize(obj):
+        buffer = io.BytesIO()
+        obj.write_to_stream(buffer, None)
+        return buffer.getvalue()
+
+    def _copy(self, obj):
+        """Copy a direct object, renumbering (and writing) what it refers to."""
+        g = self._generic
+        if isinstance(obj, g.IndirectObject):
+            return self._copy_ref(obj)
+        if isinstance(obj, g.StreamObject):
+            copied = obj.__class__()
+            copied._data = obj._data
+        elif isinstance(obj, g.DictionaryObject):
+            copied = g.DictionaryObject()
+        elif isinstance(obj, g.ArrayObject):
+            return g.ArrayObject(self._copy(item) for item in obj)
+        else:
+            return obj
+        for key, value in obj.items():
+            copied[key] = self._copy(value)
+        return copied
+
+    def _copy_ref(self, ref):
+        g = self._generic
+        key = self._key(ref)
+        number = self._numbers.get(key)
+        if number is not None:
+            return self._ref(number)
+        obj = ref.get_object()
+        if isinstance(obj, g.DictionaryObject) and obj.get("/Type") in ("/Page", "/Pages"):
+            # Page tree nodes of the source document (e.g. from /Dest arrays)
+            return g.NullObject()
+
+        shareable = isinstance(obj, g.StreamObject) or (
+            isinstance(obj, g.DictionaryObject) and obj.get("/Type") in _SHAREABLE_TYPES)
+        if key in self._in_progress:
+            # A shareable object referring back to itself; written once copied
+            number = self._numbers[key] = self._reserve()
+            return self._ref(number)
+        if not shareable:
+            # Number it before copying so references back to it resolve
+            number = self._numbers[key] = self._reserve()
+            self._write_object(number, self._serialize(self._copy(obj)))
+            return self._ref(number)
+
+        # Shareable objects are copied first (children are renumbered) and then
+        # looked up by content
+        self._in_progress.add(key)
+        body = self._serialize(self._copy(obj))
+        self._in_progress.discard(key)
+        number = self._numbers.get(key)
+        if number is not None:
+            # It referred back to itself, so it was numbered while copying
+            self._write_object(number, body)
+            return self._ref(number)
+        digest = hashlib.sha1(body).digest()
+        number = self._shared.get(digest)
+        if number is None:
+            number = self._shared[digest] = self._reserve()
+            self._write_object(number, body)
+        else:
+            self.stats["shared_objects"] += 1
+            self.stats["shared_bytes"] += len(body)
+        self._numbers[key] = number
+        return self._ref(number)
+
+
+def linearize(source, output):
+    """Rewrite the PDF in source (a seekable binary file) to output, linearized.
+
+    Returns False, leaving output untouched, if pikepdf isn't installed.
+    """
+    try:
+        import pikepdf
+    except ImportError:
+        logger.warning("pikepdf is not installed; PDF packages are not linearized")
+        return False
+    source.seek(0)
+    with pikepdf.open(source) as pdf:
+        if hasattr(output, "seek"):
+            pdf.save(output, linearize=True, deterministic_id=True)
+            return True
+        # qpdf seeks in its output; write-only files (SpoolWriter) get a copy
+        with tempfile.SpooledTemporaryFile(max_size=ARTIFACT_SPOOL_MAX) as linearized:
+            pdf.save(linearized, linearize=True, deterministic_id=True)
+            linearized.seek(0)
+            shutil.copyfileobj(linearized, output)
+    return True
+
+
+def check_package(source, titles=None):
+    """Problems with a linearized package: qpdf's linearization check and,
+    if titles are given, the top-level bookmarks. Empty list means valid."""
+    import pikepdf
+
+    problems = []
+    source.seek(0)
+    with pikepdf.open(source) as pdf:
+        if not pdf.is_linearized:
+            problems.append("not linearized")
+        else:
+            report = io.StringIO()
+            if not pdf.check_linearization(report):
+                problems.append("invalid linearization: " + report.getvalue().strip())
+        if titles is not None:
+            with pdf.open_outline() as outline:
+                found = [item.title for item in outline.root]
+            if found != list(titles):
+                problems.append(f"bookmarks {found} != {list(titles)}")
+    return problems
@@ -0,0 +1,45 @@
+"""Bounded producer/consumer pipeline for the merge-and-upload stage."""
+import queue
+import threading
+
+from arcan.config import PIPELINE_QUEUE_SIZE
+
+_DONE = object()
+
+
+def pipelined(items, build, max_pending=PIPELINE_QUEUE_SIZE):
+    """Run build(item) on a background thread, ahead of the consumer.
+
+    Yields (item, result, error) in input order. While the caller handles one
+    result (e.g. uploading it), the next items are already being built. At
+    most max_pending built results wait in the queue, which caps memory.
+    """
+    results = queue.Queue(maxsize=max(1, max_pending))
+    stop = threading.Event()
+
+    def produce():
+        for item in items:
+            if stop.is_set():
+                break
+            try:
+                results.put((item, build(item), None))
+            except Exception as e:
+                results.put((item, None, e))
+        results.put(_DONE)
+
+    producer = threading.Thread(target=produce, name="merge-producer", daemon=True)
+    producer.start()
+    try:
+        while True:
+            entry = results.get()
+            if entry is _DONE:
+                break
+            yield entry
+    finally:
+        # Consumer stopped early (error or rerun) - let the producer exit
+        stop.set()
+        while producer.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
@@ -0,0 +1,95 @@
+"""Box OAuth tokens with expiry tracking.
+
+Box access tokens live for an hour. TokenManager keeps each user's tokens in
+memory together with their expiry and only calls Box's token endpoint when
+a token is within BOX_TOKEN_REFRESH_MARGIN of expiring, so a normal page
+render costs no network or database round trip.
+"""
+import threading
+import time
+from collections import defaultdict
+
+from arcan import db
+from arcan.box import refresh_access_token
+from arcan.config import BOX_TOKEN_REFRESH_MARGIN
+
+
+class TokenManager:
+    """Process-wide cache of Box tokens keyed by box_user_id.
+
+    Refreshes are serialized per user: inside the process by a lock, across
+    processes by a row lock on box_tokens. Whoever gets the lock second sees
+    the rotated tokens and reuses them instead of refreshing again (Box
+    refresh tokens are single-use, so a second refresh would fail).
+    """
+
+    def __init__(self, margin=BOX_TOKEN_REFRESH_MARGIN):
+        self.margin = margin
+        self._tokens = {}
+        self._locks = defaultdict(threading.Lock)
+        self._guard = threading.Lock()
+        self.stats = {"hits": 0, "loads": 0, "refreshes": 0, "failures": 0}
+
+    def _fresh(self, tokens):
+        return (tokens is not None and tokens.get("expires_at") is not None
+                and tokens["expires_at"] - self.margin > time.time())
+
+    def _lock_for(self, box_user_id):
+        with self._guard:
+            return self._locks[box_user_id]
+
+    def store(self, box_user_id, access_token, refresh_token, expires_in, name=None, email=None):
+        """Save newly issued tokens (e.g. from the OAuth code exchange)."""
+        expires_at = time.time() + expires_in
+        db.upsert_tokens(box_user_id, name, email, access_token, refresh_token, expires_at)
+        self._tokens[box_user_id] = {"access_token": access_token, "refresh_token": refresh_token,
+                                     "name": name, "email": email, "expires_at": expires_at}
+
+    def get(self, box_user_id):
+        """Return a valid tokens dict for the user, refreshing if needed.
+
+        Returns None when the user has no tokens or the refresh was rejected
+        (the user has to log in again).
+        """
+        tokens = self._tokens.get(box_user_id)
+        if self._fresh(tokens):
+            self.stats["hits"] += 1
+            return tokens
+
+        with self._lock_for(box_user_id):
+            # Another session may have refreshed while we waited
+            tokens = self._tokens.get(box_user_id)
+            if self._fresh(tokens):
+                self.stats["hits"] += 1
+                return tokens
+
+            self.stats["loads"] += 1
+            tokens = db.fetch_tokens(box_user_id)
+            if tokens is None or self._fresh(tokens):
+                return self._remember(box_user_id, tokens)
+
+            with db.locked_tokens(box_user_id) as (tokens, save):
+                if tokens is None or self._fresh(tokens):
+                    # Another process refreshed while we waited on the row lock
+                    return self._remember(box_user_id, tokens)
+                access_token, refresh_token, expires_in = refresh_access_token(tokens["refresh_token"])
+                if not access_token:
+                    self.stats["failures"] += 1
+                    return self._remember(box_user_id, None)
+                self.stats["refreshes"] += 1
+                tokens = dict(tokens, access_token=access_token, refresh_token=refresh_token,
+                              expires_at=time.time() + expires_in)
+                save(access_token, refresh_token, tokens["expires_at"])
+            return self._remember(box_user_id, tokens)
+
+    def _remember(self, box_user_id, tokens):
+        if tokens is None:
+            self._tokens.pop(box_user_id, None)
+        else:
+            self._tokens[box_user_id] = tokens
+        return tokens
+
+    def forget(self, box_user_id):
+        """Drop the user's tokens from memory and the database (disconnect)."""
+        self._tokens.pop(box_user_id, None)
+        db.remove_tokens(box_user_id)
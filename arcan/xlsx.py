@@ -0,0 +1,694 @@
+"""Zip-level .xlsx sheet splicing.
+
+splice_sheets() appends worksheets from other workbooks to a base workbook
+without loading any of them into openpyxl. The worksheet XML is copied as
+is, apart from three integer rewrites:
+
+- cell, row and column style indexes, remapped into the base styles.xml
+  (fonts, fills, borders, number formats and xfs are appended to it,
+  reusing identical entries already there)
+- shared string indexes, offset past the base's shared strings
+- conditional format dxfIds
+
+Only workbook.xml, its relationships, [Content_Types].xml, styles.xml and
+sharedStrings.xml are rewritten, so the cost is close to raw zip I/O and
+the formatting is unchanged byte for byte.
+
+The XML is edited as text rather than through an XML library: re-serializing
+drops namespace declarations that mc:Ignorable still refers to, and Excel
+then reports the file as corrupt. Anything outside what is handled here
+(tables, charts, pivot tables, strict OOXML, 1900/1904 date mismatch...)
+raises SpliceError so the caller can fall back to a cell-level copy.
+"""
+import io
+import posixpath
+import re
+import zipfile
+from xml.sax.saxutils import escape, unescape
+
+MAIN_NS = b"http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+WORKSHEET_REL = REL_NS + "/worksheet"
+SHARED_STRINGS_REL = REL_NS + "/sharedStrings"
+STYLES_REL = REL_NS + "/styles"
+WORKSHEET_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"
+SHARED_STRINGS_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"
+
+# Sheet-level parts that can be copied along with a worksheet
+COPYABLE_RELS = ("/printerSettings", "/drawing", "/vmlDrawing", "/comments", "/image", "/hyperlink")
+
+# styles.xml sections in schema order, with their item element
+STYLE_SECTIONS = [
+    ("numFmts", "numFmt"), ("fonts", "font"), ("fills", "fill"), ("borders", "border"),
+    ("cellStyleXfs", "xf"), ("cellXfs", "xf"), ("cellStyles", None), ("dxfs", "dxf"),
+    ("tableStyles", None), ("colors", None), ("extLst", None),
+]
+
+_ATTR_RE = re.compile(rb'([\w:]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\')')
+_NS_DECL_RE = re.compile(rb'\sxmlns:(\w+)\s*=\s*["\']([^"\']*)["\']')
+_PREFIX_USE_RE = re.compile(rb'<(\w+):|\s(\w+):[\w-]+\s*=')
+
+# Worksheet rewrites; the leading (?:\w+:)? allows a prefixed main namespace
+_CELL_STYLE_RE = re.compile(rb'(<(?:\w+:)?c\b[^>]*?\ss=["\'])(\d+)(["\'])')
+_CELL_SST_RE = re.compile(rb'(<(?:\w+:)?c\b[^>]*?\st=["\']s["\'][^>]*>\s*<(?:\w+:)?v>)(\d+)(<)')
+_ROW_STYLE_RE = re.compile(rb'(<(?:\w+:)?row\b[^>]*?\ss=["\'])(\d+)(["\'])')
+_COL_STYLE_RE = re.compile(rb'(<(?:\w+:)?col\b[^>]*?\sstyle=["\'])(\d+)(["\'])')
+_DXF_RE = re.compile(rb'(<(?:\w+:)?cfRule\b[^>]*?\sdxfId=["\'])(\d+)(["\'])')
+_SHEET_VIEW_RE = re.compile(rb'<(?:\w+:)?sheetView\b[^>]*>')
+_TAB_SELECTED_RE = re.compile(rb'\stabSelected=["\'](?:1|true)["\']')
+
+
+class SpliceError(Exception):
+    """The workbooks use a feature the splicer doesn't handle."""
+
+
+def _attrs(tag):
+    return {name.decode(): unescape((double if double is not None else single).decode())
+            for name, double, single in _ATTR_RE.findall(tag)}
+
+
+def _element_re(name, flags=0):
+    """Regex for a complete element (empty or with content) that doesn't nest."""
+    return re.compile(rb'<(?:\w+:)?%s\b(?:[^>]*?/>|[^>]*>.*?</(?:\w+:)?%s>)' % (name, name),
+                      re.DOTALL | flags)
+
+
+def _root_tag(xml):
+    match = re.search(rb'<(?!\?|!)[^>]+>', xml)
+    return match.group(0)
+
+
+def _main_prefix(xml):
+    """The prefix bound to the spreadsheetml namespace (b'' for the default one)."""
+    root = _root_tag(xml)
+    if re.search(rb'\sxmlns\s*=\s*["\']%s["\']' % re.escape(MAIN_NS), root):
+        return b""
+    for prefix, uri in _NS_DECL_RE.findall(root):
+        if uri == MAIN_NS:
+            return prefix
+    raise SpliceError("not a transitional OOXML spreadsheet part")
+
+
+def _declare_prefixes(target_xml, source_xml, snippets):
+    """Add namespace declarations the copied snippets need to target's root."""
+    source_ns = dict(_NS_DECL_RE.findall(_root_tag(source_xml)))
+    target_root = _root_tag(target_xml)
+    target_ns = dict(_NS_DECL_RE.findall(target_root))
+    missing = {}
+    for snippet in snippets:
+        for match in _PREFIX_USE_RE.finditer(snippet):
+            prefix = match.group(1) or match.group(2)
+            if prefix in (b"xml", b"xmlns") or prefix in missing:
+                continue
+            if prefix not in source_ns:
+                continue
+            if prefix in target_ns:
+                if target_ns[prefix] != source_ns[prefix]:
+                    raise SpliceError(f"namespace prefix {prefix.decode()} is bound differently")
+                continue
+            missing[prefix] = source_ns[prefix]
+    if not missing:
+        return target_xml
+    declarations = b"".join(b' xmlns:%s="%s"' % item for item in missing.items())
+    end = target_root.rstrip(b"/>")
+    new_root = end + declarations + target_root[len(end):]
+    return target_xml.replace(target_root, new_root, 1)
+
+
+def _rels_path(part):
+    directory, name = posixpath.split(part)
+    return posixpath.join(directory, "_rels", name + ".rels")
+
+
+def _resolve(part, target):
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+
+
+def _relative(part, target):
+    return posixpath.relpath(target, posixpath.dirname(part) or ".")
+
+
+def _parse_rels(xml):
+    if xml is None:
+        return []
+    return [_attrs(tag) for tag in re.findall(rb'<(?:\w+:)?Relationship\b[^>]*>', xml)]
+
+
+def _rels_xml(rels):
+    lines = [b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+             b'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">']
+    for rel in rels:
+        attrs = "".join(f' {key}="{escape(value, {chr(34): "&quot;"})}"' for key, value in rel.items())
+        lines.append(f"<Relationship{attrs}/>".encode())
+    lines.append(b"</Relationships>")
+    return b"".join(lines)
+
+
+def _insert_before_close(xml, element, snippet):
+    close = re.search(rb'</(?:\w+:)?%s>' % element, xml)
+    if close is None:
+        raise SpliceError(f"no </{element.decode()}> element")
+    return xml[:close.start()] + snippet + xml[close.start():]
+
+
+class _Package:
+    """An .xlsx package opened for reading, with its workbook part located."""
+
+    def __init__(self, data):
+        try:
+            self.zip = zipfile.ZipFile(io.BytesIO(data))
+        except zipfile.BadZipFile:
+            raise SpliceError("not an .xlsx (zip) file")
+        self.names = set(self.zip.namelist())
+        root_rels = _parse_rels(self.read("_rels/.rels"))
+        documents = [rel for rel in root_rels if rel.get("Type", "").endswith("/officeDocument")]
+        if not documents:
+            raise SpliceError("package has no workbook part")
+        self.workbook_path = _resolve("", documents[0]["Target"])
+        self.workbook = self.read(self.workbook_path)
+        self.prefix = _main_prefix(self.workbook)
+        self.rels = _parse_rels(self.read(_rels_path(self.workbook_path)))
+        self.content_types = self.read("[Content_Types].xml")
+
+    def read(self, name):
+        return self.zip.read(name) if name in self.names else None
+
+    def part_for(self, rel_type):
+        for rel in self.rels:
+            if rel.get("Type") == rel_type:
+                return _resolve(self.workbook_path, rel["Target"])
+        return None
+
+    def sheets(self):
+        """[(start tag bytes, attrs)] for each <sheet> in workbook order."""
+        section = re.search(rb'<(?:\w+:)?sheets\b[^>]*>(.*?)</(?:\w+:)?sheets>', self.workbook, re.DOTALL)
+        if section is None:
+            raise SpliceError("workbook has no sheets")
+        return [(tag, _attrs(tag)) for tag in re.findall(rb'<(?:\w+:)?sheet\b[^>]*>', section.group(1))]
+
+    def active_index(self):
+        view = re.search(rb'<(?:\w+:)?workbookView\b[^>]*>', self.workbook)
+        tab = _attrs(view.group(0)).get("activeTab") if view else None
+        return int(tab) if tab else 0
+
+    def sheet_rel_id(self, attrs):
+        for key, value in attrs.items():
+            if key.endswith(":id"):
+                return value
+        raise SpliceError("sheet without relationship id")
+
+    def sheet_path(self, index):
+        _, attrs = self.sheets()[index]
+        rel_id = self.sheet_rel_id(attrs)
+        for rel in self.rels:
+            if rel.get("Id") == rel_id:
+                if rel.get("Type") != WORKSHEET_REL:
+                    raise SpliceError(f"sheet {attrs.get('name')!r} is not a worksheet")
+                return _resolve(self.workbook_path, rel["Target"])
+        raise SpliceError(f"no relationship {rel_id}")
+
+    def content_type(self, name):
+        for tag in re.findall(rb'<Override\b[^>]*>', self.content_types):
+            attrs = _attrs(tag)
+            if attrs.get("PartName", "").lstrip("/") == name:
+                return attrs["ContentType"], False
+        extension = posixpath.splitext(name)[1].lstrip(".").lower()
+        for tag in re.findall(rb'<Default\b[^>]*>', self.content_types):
+            attrs = _attrs(tag)
+            if attrs.get("Extension", "").lower() == extension:
+                return attrs["ContentType"], True
+        raise SpliceError(f"no content type for {name}")
+
+    def is_1904(self):
+        pr = re.search(rb'<(?:\w+:)?workbookPr\b[^>]*>', self.workbook)
+        return bool(pr) and _attrs(pr.group(0)).get("date1904") in ("1", "true")
+
+
+class _StyleSheet:
+    """Text-level view of styles.xml that can absorb another styles.xml."""
+
+    def __init__(self, xml):
+        self.xml = xml
+
+    def _section(self, name):
+        return re.search(rb'<((?:\w+:)?)%s\b([^>]*?)(/>|>(.*?)</(?:\w+:)?%s>)' % (name, name),
+                         self.xml, re.DOTALL)
+
+    def items(self, name, item):
+        section = self._section(name)
+        if section is None or section.group(4) is None:
+            return []
+        return _element_re(item).findall(section.group(4))
+
+    def _append(self, name, snippets):
+        """Append items to a section, creating the section if needed."""
+        if not snippets:
+            return
+        section = self._section(name)
+        body = b"".join(snippets)
+        if section is None:
+            prefix = _main_prefix(self.xml)
+            prefix = prefix + b":" if prefix else b""
+            new = b'<%s%s count="%d">%s</%s%s>' % (prefix, name, len(snippets), body, prefix, name)
+            later = [later_name.encode() for later_name, _ in
+                     STYLE_SECTIONS[[n for n, _ in STYLE_SECTIONS].index(name.decode()) + 1:]]
+            for later_name in later:
+                following = re.search(rb'<(?:\w+:)?%s\b' % later_name, self.xml)
+                if following:
+                    self.xml = self.xml[:following.start()] + new + self.xml[following.start():]
+                    return
+            self.xml = _insert_before_close(self.xml, b"styleSheet", new)
+            return
+        prefix, attrs, _, inner = section.groups()
+        inner = inner or b""
+        count = len(self.items(name, dict(STYLE_SECTIONS)[name.decode()].encode())) + len(snippets)
+        attrs = re.sub(rb'\scount=["\']\d+["\']', b"", attrs)
+        new = b'<%s%s%s count="%d">%s%s</%s%s>' % (prefix, name, attrs, count, inner, body, prefix, name)
+        self.xml = self.xml[:section.start()] + new + self.xml[section.end():]
+
+    def absorb(self, source_xml):
+        """Merge another workbook's styles in; returns (xf_map, dxf_map).
+
+        Identical fonts, fills, borders, number formats and xfs are reused, so
+        splicing the same styles twice doesn't grow the file.
+        """
+        if _main_prefix(self.xml) != _main_prefix(source_xml):
+            raise SpliceError("styles.xml namespace prefixes differ")
+        source = _StyleSheet(source_xml)
+        appended = []
+
+        # Custom number formats (id >= 164) get new ids unless the code exists
+        numfmt_map = {}
+        existing = {}
+        next_id = 164
+        for snippet in self.items(b"numFmts", b"numFmt"):
+            attrs = _attrs(snippet)
+            existing.setdefault(attrs.get("formatCode"), int(attrs["numFmtId"]))
+            next_id = max(next_id, int(attrs["numFmtId"]) + 1)
+        new_numfmts = []
+        for snippet in source.items(b"numFmts", b"numFmt"):
+            attrs = _attrs(snippet)
+            old_id = int(attrs["numFmtId"])
+            if attrs.get("formatCode") in existing:
+                numfmt_map[old_id] = existing[attrs.get("formatCode")]
+                continue
+            numfmt_map[old_id] = existing[attrs.get("formatCode")] = next_id
+            new_numfmts.append(re.sub(rb'numFmtId=["\']\d+["\']', b'numFmtId="%d"' % next_id, snippet, count=1))
+            next_id += 1
+        self._append(b"numFmts", new_numfmts)
+        appended += new_numfmts
+
+        def merge_items(name, item, rewrite=None):
+            targets = self.items(name, item)
+            index = {}
+            for position, snippet in enumerate(targets):
+                index.setdefault(snippet, position)
+            mapping, new = {}, []
+            for position, snippet in enumerate(source.items(name, item)):
+                if rewrite:
+                    snippet = rewrite(snippet)
+                if snippet not in index:
+                    index[snippet] = len(targets) + len(new)
+                    new.append(snippet)
+                mapping[position] = index[snippet]
+            self._append(name, new)
+            appended.extend(new)
+            return mapping
+
+        font_map = merge_items(b"fonts", b"font")
+        fill_map = merge_items(b"fills", b"fill")
+        border_map = merge_items(b"borders", b"border")
+
+        def remap_xf(style_xf_map):
+            maps = {b"fontId": font_map, b"fillId": fill_map, b"borderId": border_map,
+                    b"numFmtId": numfmt_map, b"xfId": style_xf_map}
+
+            def rewrite(snippet):
+                end = snippet.index(b">")
+
+                def replace(match):
+                    mapping = maps[match.group(1)]
+                    value = int(match.group(2))
+                    return b' %s="%d"' % (match.group(1), mapping.get(value, value))
+
+                start_tag = re.sub(rb'\s(fontId|fillId|borderId|numFmtId|xfId)=["\'](\d+)["\']',
+                                   replace, snippet[:end])
+                return start_tag + snippet[end:]
+            return rewrite
+
+        style_xf_map = merge_items(b"cellStyleXfs", b"xf", remap_xf({}))
+        xf_map = merge_items(b"cellXfs", b"xf", remap_xf(style_xf_map))
+        dxf_map = merge_items(b"dxfs", b"dxf")
+
+        self.xml = _declare_prefixes(self.xml, source_xml, appended)
+        return xf_map, dxf_map
+
+
+def _remap(pattern, xml, mapping=None, offset=0):
+    """Rewrite the integer in group 2 of every match through mapping, or add offset."""
+    if mapping is not None and all(old == new for old, new in mapping.items()):
+        return xml
+    if mapping is None and not offset:
+        return xml
+
+    def replace(match):
+        value = int(match.group(2))
+        value = mapping.get(value, value) if mapping is not None else value + offset
+        return match.group(1) + str(value).encode() + match.group(3)
+    return pattern.sub(replace, xml)
+
+
+def _quote_sheet(name):
+    return "'" + name.replace("'", "''") + "'"
+
+
+def _rename_references(text, old, new):
+    """Point sheet-qualified references in a defined name at a renamed sheet."""
+    text = text.replace(_quote_sheet(old) + "!", _quote_sheet(new) + "!")
+    return re.sub(r"(?<![\w'.])%s!" % re.escape(old), lambda _: _quote_sheet(new) + "!", text)
+
+
+class _Splicer:
+    def __init__(self, base_bytes):
+        self.base = _Package(base_bytes)
+        self.changed = {}
+        self.added = {}
+        self.names = set(self.base.names)
+        self.workbook = self.base.workbook
+        self.workbook_rels = list(self.base.rels)
+        self.content_types = self.base.content_types
+
+        styles_path = self.base.part_for(STYLES_REL)
+        if styles_path is None:
+            raise SpliceError("base workbook has no styles part")
+        self.styles_path = styles_path
+        self.styles = _StyleSheet(self.base.read(styles_path))
+        self.sst_path = self.base.part_for(SHARED_STRINGS_REL)
+        self.sst = self.base.read(self.sst_path) if self.sst_path else None
+
+        self.rel_prefix = None
+        for prefix, uri in _NS_DECL_RE.findall(_root_tag(self.workbook)):
+            if uri == REL_NS.encode():
+                self.rel_prefix = prefix.decode()
+        if self.rel_prefix is None:
+            self.rel_prefix = "r"
+            self.workbook = self.workbook.replace(
+                _root_tag(self.workbook),
+                _root_tag(self.workbook).rstrip(b"/>") + b' xmlns:r="%s">' % REL_NS.encode(), 1)
+
+    # -- package bookkeeping ------------------------------------------------
+
+    def _unique_name(self, path):
+        directory, name = posixpath.split(path)
+        stem, extension = posixpath.splitext(name)
+        stem = stem.rstrip("0123456789")
+        number = 1
+        while True:
+            candidate = posixpath.join(directory, f"{stem}{number}{extension}")
+            if candidate not in self.names:
+                self.names.add(candidate)
+                return candidate
+            number += 1
+
+    def _new_rel_id(self):
+        used = {rel.get("Id") for rel in self.workbook_rels}
+        number = len(used) + 1
+        while f"rId{number}" in used:
+            number += 1
+        return f"rId{number}"
+
+    def _add_content_type(self, name, content_type, is_default):
+        if is_default:
+            extension = posixpath.splitext(name)[1].lstrip(".")
+            for tag in re.findall(rb'<Default\b[^>]*>', self.content_types):
+                attrs = _attrs(tag)
+                if attrs.get("Extension", "").lower() == extension.lower():
+                    if attrs["ContentType"] == content_type:
+                        return
+                    break
+            else:
+                snippet = f'<Default Extension="{extension}" ContentType="{content_type}"/>'.encode()
+                self.content_types = _insert_before_close(self.content_types, b"Types", snippet)
+                return
+        snippet = f'<Override PartName="/{name}" ContentType="{content_type}"/>'.encode()
+        self.content_types = _insert_before_close(self.content_types, b"Types", snippet)
+
+    def _copy_part(self, source, path):
+        """Copy a sheet-level part and everything it references; returns its new name."""
+        new_path = self._unique_name(path)
+        content_type, is_default = source.content_type(path)
+        rels = _parse_rels(source.read(_rels_path(path)))
+        self.added[new_path] = source.read(path)
+        self._add_content_type(new_path, content_type, is_default)
+        if rels:
+            self.added[_rels_path(new_path)] = _rels_xml(self._copy_rels(source, path, new_path, rels))
+        return new_path
+
+    def _copy_rels(self, source, path, new_path, rels):
+        copied = []
+        for rel in rels:
+            rel = dict(rel)
+            if rel.get("TargetMode") != "External":
+                if not rel.get("Type", "").endswith(COPYABLE_RELS):
+                    raise SpliceError(f"sheet references an unsupported part ({rel.get('Type')})")
+                target = self._copy_part(source, _resolve(path, rel["Target"]))
+                rel["Target"] = _relative(new_path, target)
+            copied.append(rel)
+        return copied
+
+    # -- splicing ---------------------------------------------------------------
+
+    def sheet_names(self):
+        return [attrs["name"] for _, attrs in self.base_sheets()]
+
+    def base_sheets(self):
+        section = re.search(rb'<(?:\w+:)?sheets\b[^>]*>(.*?)</(?:\w+:)?sheets>', self.workbook, re.DOTALL)
+        return [(tag, _attrs(tag)) for tag in re.findall(rb'<(?:\w+:)?sheet\b[^>]*>', section.group(1))]
+
+    def _unique_title(self, title):
+        names = {name.lower() for name in self.sheet_names()}
+        candidate, number = title, 0
+        while candidate.lower() in names:
+            number += 1
+            candidate = f"{title}{number}"
+        return candidate
+
+    def rename_active(self, title):
+        index = self.base.active_index()
+        tag, attrs = self.base_sheets()[index]
+        old = attrs["name"]
+        if old == title:
+            return
+        title = self._unique_title(title)
+        new_tag = re.sub(rb'\sname=(["\'])[^"\']*\1', b' name="%s"' % escape(title).encode(), tag, count=1)
+        self.workbook = self.workbook.replace(tag, new_tag, 1)
+
+        def rename(match):
+            text = unescape(match.group(2).decode())
+            return match.group(1) + escape(_rename_references(text, old, title)).encode() + match.group(3)
+        self.workbook = re.sub(rb'(<(?:\w+:)?definedName\b[^>]*>)(.*?)(</(?:\w+:)?definedName>)',
+                               rename, self.workbook, flags=re.DOTALL)
+
+    def _shared_strings(self, source):
+        """Append source's shared strings to the base; returns the index offset."""
+        source_path = source.part_for(SHARED_STRINGS_REL)
+        source_sst = source.read(source_path) if source_path else None
+        if source_sst is None:
+            return 0
+        strings = _element_re(b"si").findall(source_sst)
+        if self.sst is None:
+            self.sst_path = self._unique_name(posixpath.join(posixpath.dirname(self.base.workbook_path),
+                                                             "sharedStrings.xml"))
+            self.sst = (b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+                        b'<sst xmlns="%s" count="0" uniqueCount="0"></sst>' % MAIN_NS)
+            self.workbook_rels.append({"Id": self._new_rel_id(), "Type": SHARED_STRINGS_REL,
+                                       "Target": _relative(self.base.workbook_path, self.sst_path)})
+            self._add_content_type(self.sst_path, SHARED_STRINGS_TYPE, False)
+        if _main_prefix(self.sst) != _main_prefix(source_sst):
+            raise SpliceError("sharedStrings.xml namespace prefixes differ")
+
+        root = _root_tag(self.sst)
+        offset = len(_element_re(b"si").findall(self.sst))
+        source_count = _attrs(_root_tag(source_sst)).get("count")
+        count = int(_attrs(root).get("count") or offset) + int(source_count or len(strings))
+        new_root = re.sub(rb'\s(count|uniqueCount)=["\']\d+["\']', b"", root)
+        end = new_root.rstrip(b"/>")
+        new_root = end + b' count="%d" uniqueCount="%d">' % (count, offset + len(strings))
+        if root.endswith(b"/>"):
+            prefix = _main_prefix(self.sst)
+            new_root += b"</%ssst>" % (prefix + b":" if prefix else b"")
+        self.sst = self.sst.replace(root, new_root, 1)
+        self.sst = _insert_before_close(self.sst, b"sst", b"".join(strings))
+        self.sst = _declare_prefixes(self.sst, source_sst, strings)
+        return offset
+
+    def append_sheet(self, source_bytes, title):
+        source = _Package(source_bytes)
+        if source.is_1904() != self.base.is_1904():
+            raise SpliceError("workbooks use different date systems")
+        if source.prefix != self.base.prefix:
+            raise SpliceError("workbook namespace prefixes differ")
+
+        source_index = source.active_index()
+        source_name = source.sheets()[source_index][1]["name"]
+        sheet_path = source.sheet_path(source_index)
+        sheet = source.read(sheet_path)
+
+        source_styles = source.part_for(STYLES_REL)
+        if source_styles is not None:
+            xf_map, dxf_map = self.styles.absorb(source.read(source_styles))
+        else:
+            xf_map, dxf_map = {}, {}
+        offset = self._shared_strings(source)
+
+        sheet = _remap(_CELL_STYLE_RE, sheet, xf_map)
+        sheet = _remap(_ROW_STYLE_RE, sheet, xf_map)
+        sheet = _remap(_COL_STYLE_RE, sheet, xf_map)
+        sheet = _remap(_DXF_RE, sheet, dxf_map)
+        sheet = _remap(_CELL_SST_RE, sheet, offset=offset)
+        # Only the base's active sheet stays selected (else Excel groups them)
+        sheet = _SHEET_VIEW_RE.sub(lambda match: _TAB_SELECTED_RE.sub(b"", match.group(0)), sheet)
+
+        new_path = self._unique_name(posixpath.join(posixpath.dirname(sheet_path) or "xl/worksheets",
+                                                    "sheet.xml"))
+        self.added[new_path] = sheet
+        self._add_content_type(new_path, WORKSHEET_TYPE, False)
+        rels = _parse_rels(source.read(_rels_path(sheet_path)))
+        if rels:
+            self.added[_rels_path(new_path)] = _rels_xml(self._copy_rels(source, sheet_path, new_path, rels))
+
+        rel_id = self._new_rel_id()
+        self.workbook_rels.append({"Id": rel_id, "Type": WORKSHEET_REL,
+                                   "Target": _relative(self.base.workbook_path, new_path)})
+
+        title = self._unique_title(title)
+        sheets = self.base_sheets()
+        new_index = len(sheets)
+        sheet_id = max(int(attrs.get("sheetId", 0)) for _, attrs in sheets) + 1
+        prefix = self.base.prefix + b":" if self.base.prefix else b""
+        element = b'<%ssheet name="%s" sheetId="%d" %s:id="%s"/>' % (
+            prefix, escape(title, {'"': "&quot;"}).encode(), sheet_id, self.rel_prefix.encode(), rel_id.encode())
+        self.workbook = _insert_before_close(self.workbook, b"sheets", element)
+
+        # Print titles/areas of the copied sheet
+        names = []
+        for tag, text in re.findall(rb'(<(?:\w+:)?definedName\b[^>]*>)(.*?)</(?:\w+:)?definedName>',
+                                    source.workbook, re.DOTALL):
+            if _attrs(tag).get("localSheetId") != str(source_index):
+                continue
+            tag = re.sub(rb'localSheetId=["\']\d+["\']', b'localSheetId="%d"' % new_index, tag)
+            text = escape(_rename_references(unescape(text.decode()), source_name, title)).encode()
+            names.append(tag + text + b"</%sdefinedName>" % prefix)
+        if names:
+            if re.search(rb'</(?:\w+:)?definedNames>', self.workbook):
+                self.workbook = _insert_before_close(self.workbook, b"definedNames", b"".join(names))
+            else:
+                block = b"<%sdefinedNames>%s</%sdefinedNames>" % (prefix, b"".join(names), prefix)
+                anchor = (re.search(rb'</(?:\w+:)?externalReferences>', self.workbook)
+                          or re.search(rb'</(?:\w+:)?sheets>', self.workbook))
+                self.workbook = self.workbook[:anchor.end()] + block + self.workbook[anchor.end():]
+
+    def write(self):
+        self.changed[self.base.workbook_path] = self.workbook
+        self.changed[_rels_path(self.base.workbook_path)] = _rels_xml(self.workbook_rels)
+        self.changed["[Content_Types].xml"] = self.content_types
+        self.changed[self.styles_path] = self.styles.xml
+        if self.sst is not None:
+            if self.sst_path in self.base.names:
+                self.changed[self.sst_path] = self.sst
+            else:
+                self.added[self.sst_path] = self.sst
+
+        output = io.BytesIO()
+        with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as out_zip:
+            for info in self.base.zip.infolist():
+                data = self.changed.get(info.filename)
+                if data is None:
+                    data = self.base.zip.read(info)
+                out_zip.writestr(info, data, compress_type=info.compress_type)
+            for name, data in self.added.items():
+                # Fixed timestamp so the same inputs give byte-identical output
+                info = zipfile.ZipInfo(name, date_time=(1980, 1, 1, 0, 0, 0))
+                out_zip.writestr(info, data, compress_type=zipfile.ZIP_DEFLATED)
+        return output.getvalue()
+
+
+def splice_sheets(base_bytes, base_title, sheets):
+    """Append worksheets from other workbooks to a base workbook.
+
+    base_title renames the base's active sheet (None keeps its name); sheets
+    is a list of (workbook bytes, title) whose active sheet is appended under
+    that title. Returns the new .xlsx bytes; raises SpliceError if a workbook
+    uses something that can't be spliced.
+    """
+    splicer = _Splicer(base_bytes)
+    if base_title:
+        splicer.rename_active(base_title)
+    for source_bytes, title in sheets:
+        splicer.append_sheet(source_bytes, title)
+    return splicer.write()
+
+
+def _local(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def sheet_stats(data):
+    """(rows, xml_bytes) of a workbook's active sheet, without parsing the sheet.
+
+    rows comes from the sheet's <dimension> and is None if it's missing.
+    """
+    package = _Package(data)
+    path = package.sheet_path(package.active_index())
+    size = package.zip.getinfo(path).file_size
+    with package.zip.open(path) as sheet:
+        head = sheet.read(64 * 1024)
+    match = re.search(rb'<(?:\w+:)?dimension\b[^>]*?\sref=["\'](?:[A-Z]+\d+:)?[A-Z]+(\d+)["\']', head)
+    return (int(match.group(1)) if match else None), size
+
+
+def sheet_layout(data):
+    """Merged ranges, column widths and frozen pane of a workbook's active sheet.
+
+    Read-only openpyxl worksheets don't expose these, so the sheet XML is
+    streamed here instead; completed rows are discarded as the parse goes,
+    keeping memory flat however long the sheet is. Returns a dict with
+    "merged" (list of range strings), "cols" (list of dicts with min, max,
+    width, hidden) and "freeze" (top-left cell of the frozen pane or None).
+    """
+    import xml.etree.ElementTree as ET
+
+    package = _Package(data)
+    path = package.sheet_path(package.active_index())
+    layout = {"merged": [], "cols": [], "freeze": None}
+    sheet_data = None
+    with package.zip.open(path) as sheet:
+        for event, elem in ET.iterparse(sheet, events=("start", "end")):
+            name = _local(elem.tag)
+            if event == "start":
+                if name == "sheetData":
+                    sheet_data = elem
+                continue
+            if name == "row" and sheet_data is not None:
+                sheet_data.clear()
+            elif name == "mergeCell":
+                layout["merged"].append(elem.get("ref"))
+            elif name == "col":
+                layout["cols"].append({
+                    "min": int(elem.get("min")),
+                    "max": int(elem.get("max")),
+                    "width": float(elem.get("width")) if elem.get("width") else None,
+                    "hidden": elem.get("hidden") in ("1", "true"),
+                })
+            elif name == "pane" and elem.get("state") in ("frozen", "frozenSplit"):
+                top_left = elem.get("topLeftCell")
+                if not top_left:
+                    from openpyxl.utils import get_column_letter
+
+                    column = int(float(elem.get("xSplit") or 0)) + 1
+                    row = int(float(elem.get("ySplit") or 0)) + 1
+                    top_left = f"{get_column_letter(column)}{row}"
+                layout["freeze"] = top_left
+    return layout
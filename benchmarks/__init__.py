@@ -0,0 +1 @@
+"""Benchmarks for the aggregation pipeline (run with ``python -m benchmarks.<name>``)."""
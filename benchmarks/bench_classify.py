@@ -0,0 +1,65 @@
+"""Benchmark single-pass PDF classification against the original two-pass path.
+
+Usage:
+    python -m benchmarks.bench_classify [--repeat N] [report.pdf ...]
+
+With no files, Yardi-style reports from benchmarks.corpus are used: a 60-page rent
+roll, a 120-page general ledger and a 12-month statement.
+"""
+import argparse
+import statistics
+import time
+from pathlib import Path
+
+from arcan.classify import classify_pdf, extract_property_info, is_t12_or_ytd
+from benchmarks.corpus import PROPERTIES, T12_PERIOD, yardi_report
+
+
+def synthetic_corpus():
+    prop_name, prop_code = PROPERTIES[0]
+    return {
+        "rent_roll.pdf": yardi_report(prop_name, prop_code, "Rent Roll with Lease Charges", "As of = 09/30/2026", 60),
+        "general_ledger.pdf": yardi_report(prop_name, prop_code, "General Ledger", "Period = Sep 2026 - Sep 2026",
+                                           120),
+        "12_month_statement.pdf": yardi_report(prop_name, prop_code, "12 Month Statement", T12_PERIOD, 4),
+    }
+
+
+def two_pass(file_bytes):
+    name, code = extract_property_info(file_bytes)
+    return name, code, is_t12_or_ytd(file_bytes)
+
+
+def single_pass(file_bytes):
+    result = classify_pdf(file_bytes)
+    return result["property_name"], result["property_code"], result["period"]
+
+
+def _time(func, file_bytes, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(file_bytes)
+        samples.append(time.perf_counter() - start)
+    return result, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", type=Path, help="PDF reports to classify")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    corpus = {path.name: path.read_bytes() for path in args.files} or synthetic_corpus()
+
+    print(f"{'file':<32} {'KB':>7} {'two-pass ms':>12} {'single ms':>10} {'speedup':>8}  match")
+    for name, file_bytes in corpus.items():
+        expected, two_pass_time = _time(two_pass, file_bytes, args.repeat)
+        actual, single_time = _time(single_pass, file_bytes, args.repeat)
+        print(f"{name[:32]:<32} {len(file_bytes) / 1024:>7.0f} {two_pass_time * 1000:>12.1f} "
+              f"{single_time * 1000:>10.1f} {two_pass_time / single_time:>7.1f}x  "
+              f"{'yes' if expected == actual else f'NO {expected} != {actual}'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Benchmark copying a General Ledger sheet between workbooks.
+
+Usage:
+    python -m benchmarks.bench_excel_merge [--rows N] [gl.xlsx]
+
+Compares the original per-cell copy (six style object copies per styled
+cell) with the interned copy in arcan.merge.copy_sheet, reporting cells/s
+for the copy itself and for copy + save. The zip-level splice that
+merge_excel_files uses by default is timed for reference. With no file, a
+benchmarks.corpus General Ledger with --rows detail lines is generated.
+"""
+import argparse
+import io
+import time
+from copy import copy
+
+from arcan.merge import StyleInterner, copy_sheet
+from arcan.xlsx import splice_sheets
+from benchmarks.corpus import PROPERTIES, gl_workbook
+
+
+def naive_copy(source_ws, ws):
+    """The original copy loop: fresh style objects for every styled cell."""
+    from openpyxl.cell.cell import MergedCell
+
+    for row in source_ws.iter_rows():
+        for cell in row:
+            if isinstance(cell, MergedCell):
+                continue
+            new_cell = ws.cell(row=cell.row, column=cell.column)
+            new_cell.value = cell.value
+            if cell.has_style:
+                new_cell.font = copy(cell.font)
+                new_cell.border = copy(cell.border)
+                new_cell.fill = copy(cell.fill)
+                new_cell.number_format = cell.number_format
+                new_cell.protection = copy(cell.protection)
+                new_cell.alignment = copy(cell.alignment)
+
+
+def interned_copy(source_ws, ws):
+    interner = StyleInterner()
+    copy_sheet(source_ws, ws, interner)
+    return interner
+
+
+def _run(copy_func, gl_bytes):
+    from openpyxl import Workbook, load_workbook
+
+    source_ws = load_workbook(io.BytesIO(gl_bytes)).active
+    cells = sum(1 for row in source_ws.iter_rows() for _ in row)
+    wb = Workbook()
+    start = time.perf_counter()
+    result = copy_func(source_ws, wb.create_sheet("General Ledger"))
+    copied = time.perf_counter() - start
+    wb.save(io.BytesIO())
+    saved = time.perf_counter() - start
+    return cells, copied, saved, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", nargs="?", help="GL workbook to copy")
+    parser.add_argument("--rows", type=int, default=50000)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, "rb") as f:
+            gl_bytes = f.read()
+    else:
+        gl_bytes = gl_workbook(*PROPERTIES[0], args.rows)
+    print(f"GL workbook: {len(gl_bytes) / 1024 / 1024:.1f} MB")
+
+    print(f"{'path':<10} {'cells':>9} {'copy s':>8} {'cells/s':>10} {'+save s':>8} {'cells/s':>10}")
+    for name, func in (("naive", naive_copy), ("interned", interned_copy)):
+        cells, copied, saved, result = _run(func, gl_bytes)
+        print(f"{name:<10} {cells:>9,} {copied:>8.2f} {cells / copied:>10,.0f} {saved:>8.2f} {cells / saved:>10,.0f}")
+        if isinstance(result, StyleInterner):
+            print(f"{'':<10} {result.misses} distinct styles, {result.hits:,} cells reused one")
+
+    base = gl_workbook(*PROPERTIES[0], 10)
+    start = time.perf_counter()
+    splice_sheets(base, "T-12 Statement", [(gl_bytes, "General Ledger")])
+    print(f"{'splice':<10} {'':>9} {time.perf_counter() - start:>8.2f}  (zip-level, used by default)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Benchmark the PDF package merge and check its output.
+
+Usage:
+    python -m benchmarks.bench_pdf_package [--pages N] [report.pdf ...]
+
+Merges one report per report_patterns type (or the given PDFs, in order)
+with arcan.merge.merge_pdfs and with PyPDF2's PdfMerger, reporting time and
+output size for each. With no files, benchmarks.corpus reports that all
+carry the same logo are generated.
+
+The merged package is then checked: it must be valid linearized PDF (qpdf's
+own linearization check, through pikepdf) and have one top-level bookmark
+per report, in report order. Exits non-zero if either check fails, so it
+can run in CI.
+"""
+import argparse
+import io
+import sys
+import time
+from pathlib import Path
+
+from arcan.intake import report_patterns
+from arcan.merge import merge_pdfs
+from arcan.pdf import check_package
+from benchmarks.corpus import PROPERTIES, yardi_report
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def pdfmerger_size(pdf_files):
+    from PyPDF2 import PdfMerger
+
+    merger = PdfMerger()
+    for item in pdf_files:
+        merger.append(io.BytesIO(item["bytes"]))
+    output = io.BytesIO()
+    merger.write(output)
+    merger.close()
+    return output.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="report PDFs, in package order")
+    parser.add_argument("--pages", type=int, default=3, help="pages per synthetic report")
+    args = parser.parse_args()
+
+    if args.files:
+        pdf_files = [{"bytes": Path(name).read_bytes(), "report_type": Path(name).stem} for name in args.files]
+    else:
+        pdf_files = [{"bytes": yardi_report(*PROPERTIES[0], name, "Period = Sep 2026", args.pages,
+                                            logo=ROOT / "logo.png"), "report_type": name}
+                     for _, name, _ in report_patterns if name != "General Ledger"]
+    titles = [item["report_type"] for item in pdf_files]
+
+    start = time.perf_counter()
+    merger_bytes = pdfmerger_size(pdf_files)
+    merger_seconds = time.perf_counter() - start
+
+    output = io.BytesIO()
+    start = time.perf_counter()
+    stats = merge_pdfs(pdf_files, output)
+    seconds = time.perf_counter() - start
+
+    print(f"inputs:     {stats['inputs']} reports, {stats['pages']} pages, {stats['input_bytes'] / 1024:,.0f} KB")
+    print(f"PdfMerger:  {merger_bytes / 1024:8,.0f} KB {merger_seconds:6.2f} s")
+    print(f"merge_pdfs: {stats['output_bytes'] / 1024:8,.0f} KB {seconds:6.2f} s "
+          f"({stats['shared_objects']} shared objects, {stats['shared_bytes'] / 1024:,.0f} KB written once, "
+          f"{'linearized' if stats['linearized'] else 'not linearized'})")
+
+    problems = check_package(output, titles)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
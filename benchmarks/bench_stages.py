@@ -0,0 +1,279 @@
+"""Stage-level benchmark suite on the synthetic corpus.
+
+Usage:
+    python -m benchmarks.bench_stages [--properties N] [--scale X] [--repeat N] [--stage NAME ...]
+                                      [--baseline FILE] [--save-baseline]
+
+Times each stage of the pipeline on its own, on the corpus from
+benchmarks.corpus:
+
+- identify_report: report type from the filename
+- extract_property_info, is_t12_or_ytd: the original two-pass classifiers
+- classify_pdf: the single-pass classifier intake uses
+- excel_to_pdf: LibreOffice conversion of the 12 Month Statement workbooks
+  (skipped if LibreOffice isn't installed)
+- merge_pdfs: each property's package, as build_package writes it
+- merge_excel_files: the Excel package of each PROPERTIES_WITH_EXCEL property
+
+Per stage it reports throughput (calls/s and input MB/s), latency
+percentiles, the "best" latency (median over inputs of each input's fastest
+pass) and the peak Python memory of a single call. Peak memory is measured
+with tracemalloc in a fresh process per stage after a warm-up pass, so it
+doesn't depend on which stages ran before. Classifier results are checked
+against what the corpus says each file is.
+
+Results are compared with the baseline file (benchmarks/baseline.json by
+default; --save-baseline writes it). The run exits non-zero if a stage's
+best latency or peak memory grew past the tolerance, or a classifier got a
+file wrong, so it can gate a deploy. The latency check uses best-of-passes
+rather than the median, divided by the best time of a fixed calibration
+loop run between passes: that keeps scheduler noise and the host speeding
+up or slowing down between runs from tripping it. The baseline is only
+comparable on the same machine and corpus settings.
+"""
+import argparse
+import io
+import zlib
+import json
+import math
+import multiprocessing
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from benchmarks.corpus import generate_corpus
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_BASELINE = ROOT / "benchmarks" / "baseline.json"
+
+# Allowed growth over the baseline before a stage counts as regressed
+LATENCY_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.10
+# Best latency changes smaller than this are timer noise (ms)
+MIN_LATENCY_DELTA_MS = 0.05
+
+
+def percentile(samples, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def build_stages(corpus, conversion_pool):
+    """{stage name: [(call, input bytes, expected result or None)]}; call() runs the stage once."""
+    from arcan.classify import classify_pdf, extract_property_info, is_t12_or_ytd
+    from arcan.intake import EXCEL_PACKAGE_SHEETS, identify_report
+    from arcan.libreoffice import excel_to_pdf
+    from arcan.merge import merge_excel_files, merge_pdfs
+
+    pdfs = [item for item in corpus if item["filename"].endswith(".pdf")]
+    workbooks = [item for item in corpus if item["filename"].endswith(".xlsx")]
+    stages = {
+        "identify_report": [(lambda item=item: identify_report(item["filename"]), 0, None) for item in corpus],
+        "extract_property_info": [(lambda item=item: extract_property_info(item["bytes"]), len(item["bytes"]),
+                                   (item["prop_name"], item["prop_code"])) for item in pdfs],
+        "is_t12_or_ytd": [(lambda item=item: is_t12_or_ytd(item["bytes"]), len(item["bytes"]), item["period"])
+                          for item in pdfs if item["period"]],
+        "classify_pdf": [(lambda item=item: _classification(classify_pdf(item["bytes"])), len(item["bytes"]),
+                          (item["prop_code"], item["period"])) for item in pdfs],
+    }
+
+    if conversion_pool is not None:
+        stages["excel_to_pdf"] = [(lambda item=item: excel_to_pdf(item["bytes"], conversion_pool)[:5],
+                                   len(item["bytes"]), b"%PDF-")
+                                  for item in workbooks if item["report_type"] != "General Ledger"]
+
+    properties = {}
+    for item in corpus:
+        properties.setdefault(item["prop_code"], []).append(item)
+    stages["merge_pdfs"] = []
+    stages["merge_excel_files"] = []
+    for items in properties.values():
+        # In package order, as build_package passes them
+        pdf_files = sorted(({"bytes": item["bytes"], "report_type": item["report_type"],
+                             "order": identify_report(item["filename"])[0]} for item in items
+                            if item["filename"].endswith(".pdf")), key=lambda entry: entry["order"])
+        stages["merge_pdfs"].append((lambda pdf_files=pdf_files: merge_pdfs(pdf_files, io.BytesIO())["pages"],
+                                     sum(len(entry["bytes"]) for entry in pdf_files), None))
+        excel = {EXCEL_PACKAGE_SHEETS[item["report_type"]]: item["bytes"] for item in items
+                 if item["filename"].endswith(".xlsx")}
+        if excel:
+            stages["merge_excel_files"].append(
+                (lambda excel=excel: len(merge_excel_files(excel["T-12"], excel["YTD"], excel["GL"])),
+                 sum(len(data) for data in excel.values()), None))
+    return {name: calls for name, calls in stages.items() if calls}
+
+
+def _classification(result):
+    return result["property_code"], result["period"]
+
+
+def calibrate():
+    """A fixed mix of interpreter and C work whose time tracks the host's speed."""
+    start = time.perf_counter()
+    counts = {}
+    for n in range(200000):
+        counts[n % 1000] = counts.get(n % 1000, 0) + n
+    zlib.compress(bytes(range(256)) * 4000)
+    return time.perf_counter() - start
+
+
+def run_stage(calls, repeat):
+    """Time every call `repeat` times after a warm-up pass, with a calibration run before each pass."""
+    mismatches = 0
+    for call, _, expected in calls:
+        if expected is not None and call() != expected:
+            mismatches += 1
+
+    samples = []
+    best = [math.inf] * len(calls)
+    calibration = math.inf
+    elapsed = 0.0
+    for _ in range(repeat):
+        calibration = min(calibration, calibrate())
+        start = time.perf_counter()
+        for index, (call, _, _) in enumerate(calls):
+            call_start = time.perf_counter()
+            call()
+            seconds = time.perf_counter() - call_start
+            samples.append(seconds)
+            best[index] = min(best[index], seconds)
+        elapsed += time.perf_counter() - start
+
+    input_bytes = sum(size for _, size, _ in calls) * repeat
+    return {
+        "calls": len(samples),
+        "calls_per_s": len(samples) / elapsed,
+        "mb_per_s": input_bytes / 1024 / 1024 / elapsed,
+        "best_ms": statistics.median(best) * 1000,
+        "calibration_ms": calibration * 1000,
+        # Best latency in units of the calibration loop; what compare() checks
+        "relative": statistics.median(best) / calibration,
+        "p50_ms": percentile(samples, 50) * 1000,
+        "p90_ms": percentile(samples, 90) * 1000,
+        "p99_ms": percentile(samples, 99) * 1000,
+        "max_ms": max(samples) * 1000,
+        "mismatches": mismatches,
+    }
+
+
+def stage_peak(corpus, name):
+    """Peak traced memory (MB) of a single call of one stage, after a warm-up
+    pass. Run it in a fresh process: what earlier stages left cached or
+    allocated would otherwise shift the peak."""
+    conversion_pool = None
+    if name == "excel_to_pdf":
+        from arcan.libreoffice import start_conversion_pool
+
+        conversion_pool = start_conversion_pool()
+    try:
+        calls = build_stages(corpus, conversion_pool)[name]
+        for call, _, _ in calls:
+            call()
+        peak = 0
+        tracemalloc.start()
+        try:
+            for call, _, _ in calls:
+                tracemalloc.reset_peak()
+                call()
+                peak = max(peak, tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    finally:
+        if conversion_pool is not None:
+            conversion_pool.shutdown()
+    return peak / 1024 / 1024
+
+
+def measure_peak(corpus, name):
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+        return executor.submit(stage_peak, corpus, name).result()
+
+
+def compare(results, baseline, latency_tolerance, memory_tolerance):
+    """Regression messages for stages that got slower or bigger than the baseline."""
+    problems = []
+    for name, result in results.items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None:
+            continue
+        floor = MIN_LATENCY_DELTA_MS / result["calibration_ms"]
+        limit = max(base["relative"] * (1 + latency_tolerance), base["relative"] + floor)
+        if result["relative"] > limit:
+            problems.append(f"{name}: {result['relative']:.3f}x calibration ({result['best_ms']:.2f} ms), "
+                            f"baseline {base['relative']:.3f}x ({base['best_ms']:.2f} ms)")
+        if result["peak_mb"] > base["peak_mb"] * (1 + memory_tolerance) + 0.1:
+            problems.append(f"{name}: peak {result['peak_mb']:.1f} MB, baseline {base['peak_mb']:.1f} MB")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--properties", type=int, default=3)
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="timed passes over each stage's inputs")
+    parser.add_argument("--stage", action="append", help="only run this stage (repeatable)")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--latency-tolerance", type=float, default=LATENCY_TOLERANCE)
+    parser.add_argument("--memory-tolerance", type=float, default=MEMORY_TOLERANCE)
+    args = parser.parse_args()
+
+    from arcan.libreoffice import start_conversion_pool
+
+    settings = {"properties": args.properties, "scale": args.scale, "seed": args.seed}
+    corpus = generate_corpus(**settings)
+    print(f"corpus: {len(corpus)} files, {sum(len(item['bytes']) for item in corpus) / 1024 / 1024:.1f} MB")
+
+    conversion_pool = start_conversion_pool() if not args.stage or "excel_to_pdf" in args.stage else None
+    try:
+        stages = build_stages(corpus, conversion_pool)
+        if conversion_pool is None:
+            print("excel_to_pdf: skipped (LibreOffice not installed)")
+        results = {}
+        print(f"{'stage':<22} {'calls/s':>9} {'MB/s':>7} {'best ms':>8} {'p50 ms':>8} {'p90 ms':>8} "
+              f"{'p99 ms':>8} {'peak MB':>8}")
+        for name, calls in stages.items():
+            if args.stage and name not in args.stage:
+                continue
+            result = results[name] = run_stage(calls, args.repeat)
+            result["peak_mb"] = measure_peak(corpus, name)
+            print(f"{name:<22} {result['calls_per_s']:>9.1f} {result['mb_per_s']:>7.1f} {result['best_ms']:>8.3f} "
+                  f"{result['p50_ms']:>8.3f} {result['p90_ms']:>8.3f} {result['p99_ms']:>8.3f} "
+                  f"{result['peak_mb']:>8.1f}")
+    finally:
+        if conversion_pool is not None:
+            conversion_pool.shutdown()
+
+    problems = [f"{name}: {result['mismatches']} file(s) classified wrongly"
+                for name, result in results.items() if result["mismatches"]]
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps({
+            "corpus": settings,
+            "machine": f"{platform.machine()} {platform.processor() or platform.system()}",
+            "python": platform.python_version(),
+            "stages": {name: {key: round(value, 4) for key, value in result.items()}
+                       for name, result in results.items()},
+        }, indent=2) + "\n")
+        print(f"baseline written to {args.baseline}")
+    elif not args.baseline.exists():
+        print(f"no baseline at {args.baseline}; run with --save-baseline to record one")
+    else:
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get("corpus") != settings:
+            print(f"baseline corpus {baseline.get('corpus')} differs from {settings}; not compared")
+        else:
+            problems += compare(results, baseline, args.latency_tolerance, args.memory_tolerance)
+            if not problems:
+                print(f"no regressions against {args.baseline}")
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
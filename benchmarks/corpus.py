@@ -0,0 +1,248 @@
+"""Deterministic synthetic corpus of Yardi-style reports.
+
+Usage:
+    python -m benchmarks.corpus OUTPUT_DIR [--properties N] [--scale X] [--seed N]
+
+Writes a month's worth of uploads for N properties: Balance Sheet, Budget
+Comparison, multi-page Rent Roll, receivables and payables aging, and the
+T-12 and YTD 12 Month Statements as PDFs. Properties in
+PROPERTIES_WITH_EXCEL (the first one is always Marsh Point (marshp)) get
+T-12, YTD and General Ledger workbooks too. --scale multiplies page and row
+counts. The same arguments always give byte-identical files, so the
+directory doubles as an inbox for ``python -m arcan aggregate``.
+"""
+import argparse
+import io
+import random
+import re
+import zipfile
+from pathlib import Path
+
+# Fixed document dates so output is byte-identical between runs
+FIXED_DATE = (2026, 9, 30, 0, 0, 0)
+FIXED_W3CDTF = b"2026-09-30T00:00:00Z"
+
+PROPERTIES = [
+    ("Marsh Point", "marshp"),
+    ("Oak Ridge", "oakrdg"),
+    ("Elm Court", "elmct"),
+    ("Emerson", "emersn"),
+    ("Cedar Lane", "cedarl"),
+    ("Willow Creek", "willcr"),
+    ("Harbor View", "harbvw"),
+    ("Pine Hollow", "pineho"),
+]
+
+T12_PERIOD = "Oct 2025 - Sep 2026"
+YTD_PERIOD = "Jan 2026 - Sep 2026"
+MONTHS = ["Oct 2025", "Nov 2025", "Dec 2025", "Jan 2026", "Feb 2026", "Mar 2026", "Apr 2026", "May 2026",
+          "Jun 2026", "Jul 2026", "Aug 2026", "Sep 2026"]
+
+# (filename stem, report title, period line, pages at scale 1)
+PDF_REPORTS = [
+    ("Balance_Sheet", "Balance Sheet", "Period = Sep 2026", 2),
+    ("Budget_Comparison", "Budget Comparison", "Period = Sep 2026", 3),
+    ("RentRollwithLeaseCharges", "Rent Roll with Lease Charges", "As of = 09/30/2026", 20),
+    ("Aging_Summary", "Aging Summary", "As of = 09/30/2026", 2),
+    ("PayablesAgingReport", "Payables Aging Report", "As of = 09/30/2026", 2),
+]
+
+
+def yardi_report(prop_name, prop_code, title, period, pages, seed=0, rows_per_page=48, logo=None):
+    """A landscape report: "Name (code)" header block on page 1, then ledger
+    rows. With logo (an image path), every page carries it in the header."""
+    from reportlab.lib.pagesizes import landscape, letter
+    from reportlab.pdfgen import canvas
+
+    rng = random.Random(f"{seed}:{prop_code}:{title}:{period}")
+    output = io.BytesIO()
+    width, height = landscape(letter)
+    pdf = canvas.Canvas(output, pagesize=(width, height), invariant=1)
+    for page in range(pages):
+        y = height - 40
+        if logo:
+            pdf.drawImage(str(logo), width - 160, height - 70, width=120, height=40, preserveAspectRatio=True)
+        if page == 0:
+            for line in (f"{prop_name} ({prop_code})", title, period, "Book = Accrual"):
+                pdf.setFont("Helvetica-Bold", 11)
+                pdf.drawString(40, y, line)
+                y -= 16
+        pdf.setFont("Helvetica", 7)
+        pdf.drawRightString(width - 40, 20, f"Page {page + 1}")
+        for row in range(rows_per_page):
+            unit = page * rows_per_page + row
+            pdf.drawString(40, y, f"{1000 + unit}")
+            pdf.drawString(100, y, f"Resident {rng.randrange(100000):05d}")
+            pdf.drawString(260, y, f"09/{1 + unit % 28:02d}/2026")
+            for col in range(8):
+                pdf.drawRightString(380 + col * 50, y, f"{rng.randrange(1000000) / 100:,.2f}")
+            y -= 10
+            if y < 30:
+                break
+        pdf.showPage()
+    pdf.save()
+    return output.getvalue()
+
+
+def _normalize_xlsx(data):
+    """Pin the timestamps openpyxl writes (zip entries, docProps/core.xml)."""
+    output = io.BytesIO()
+    with zipfile.ZipFile(io.BytesIO(data)) as source, zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as target:
+        for info in source.infolist():
+            content = source.read(info)
+            if info.filename == "docProps/core.xml":
+                content = re.sub(rb"(<dcterms:(?:created|modified)[^>]*>)[^<]*", rb"\g<1>" + FIXED_W3CDTF, content)
+            target.writestr(zipfile.ZipInfo(info.filename, date_time=FIXED_DATE), content,
+                            compress_type=zipfile.ZIP_DEFLATED)
+    return output.getvalue()
+
+
+def _save(wb):
+    output = io.BytesIO()
+    wb.save(output)
+    return _normalize_xlsx(output.getvalue())
+
+
+def _title_block(ws, lines, width):
+    from openpyxl.styles import Font
+
+    for row, text in enumerate(lines, 1):
+        ws.cell(row, 1, text).font = Font(name="Arial", size=12 if row == 1 else 10, bold=True)
+        ws.merge_cells(start_row=row, start_column=1, end_row=row, end_column=width)
+
+
+def statement_workbook(prop_name, prop_code, period, accounts=120, seed=0):
+    """A 12 Month Statement workbook (T-12 or YTD, by period): an account
+    column, one column per month in the period and a total."""
+    from openpyxl import Workbook
+    from openpyxl.styles import Border, Font, PatternFill, Side
+
+    rng = random.Random(f"{seed}:{prop_code}:{period}")
+    months = MONTHS if period == T12_PERIOD else MONTHS[3:]
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Report1"
+    _title_block(ws, (f"{prop_name} ({prop_code})", "12 Month Statement", f"Period = {period}",
+                      "Book = Accrual"), len(months) + 2)
+    header_font = Font(name="Arial", size=9, bold=True, color="FFFFFF")
+    header_fill = PatternFill("solid", fgColor="1F4E78")
+    for col, text in enumerate(["Account"] + months + ["Total"], 1):
+        cell = ws.cell(6, col, text)
+        cell.font = header_font
+        cell.fill = header_fill
+    money = '#,##0.00_);(#,##0.00)'
+    body_font = Font(name="Arial", size=8)
+    for index in range(accounts):
+        row = 7 + index
+        ws.cell(row, 1, f"{4000 + index * 10} Account {index}").font = body_font
+        for col in range(2, len(months) + 2):
+            cell = ws.cell(row, col, rng.randrange(-500000, 5000000) / 100)
+            cell.number_format = money
+            cell.font = body_font
+        total = ws.cell(row, len(months) + 2, f"=SUM(B{row}:{ws.cell(row, len(months) + 1).column_letter}{row})")
+        total.number_format = money
+        total.font = Font(name="Arial", size=8, bold=True)
+        if index % 20 == 19:
+            total.border = Border(top=Side(style="thin"), bottom=Side(style="double"))
+    ws.freeze_panes = "B7"
+    ws.column_dimensions["A"].width = 36
+    return _save(wb)
+
+
+def gl_workbook(prop_name, prop_code, rows=5000, seed=0):
+    """A General Ledger detail workbook: merged title block, wrapped headers,
+    dated entries and a ruled total row every 40 lines."""
+    from openpyxl import Workbook
+    from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+    rng = random.Random(f"{seed}:{prop_code}:gl")
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Report1"
+    _title_block(ws, (f"{prop_name} ({prop_code})", "General Ledger", "Period = Sep 2026", "Book = Accrual"), 9)
+    headers = ["Property", "Date", "Period", "Description", "Control", "Reference", "Debit", "Credit", "Balance"]
+    for col, text in enumerate(headers, 1):
+        cell = ws.cell(6, col, text)
+        cell.font = Font(name="Arial", size=9, bold=True, color="FFFFFF")
+        cell.fill = PatternFill("solid", fgColor="1F4E78")
+        cell.alignment = Alignment(horizontal="center", wrap_text=True)
+    money = '#,##0.00_);(#,##0.00)'
+    body_font = Font(name="Arial", size=8)
+    total_font = Font(name="Arial", size=8, bold=True)
+    rule = Border(top=Side(style="thin"), bottom=Side(style="double"))
+    balance = 0.0
+    for index in range(rows):
+        row = 7 + index
+        amount = rng.randrange(1, 2000000) / 100
+        debit = rng.random() < 0.5
+        balance += amount if debit else -amount
+        values = [prop_code, f"09/{1 + index % 28:02d}/2026", "09-2026", f"Entry {index}",
+                  f"J-{rng.randrange(100000)}", f"R{index:06d}", amount if debit else None,
+                  None if debit else amount, round(balance, 2)]
+        total = index % 40 == 39
+        for col, value in enumerate(values, 1):
+            cell = ws.cell(row, col, value)
+            cell.font = total_font if total else body_font
+            if col >= 7:
+                cell.number_format = money
+            if total:
+                cell.border = rule
+    ws.freeze_panes = "A7"
+    for column, width in zip("ABCDEFGHI", (9, 11, 8, 38, 11, 9, 13, 13, 14)):
+        ws.column_dimensions[column].width = width
+    return _save(wb)
+
+
+def generate_corpus(properties=3, scale=1.0, seed=0):
+    """The uploads for a month: a list of dicts with filename, bytes and the
+    expected prop_name, prop_code, report_type and (12 Month Statements)
+    period."""
+    from arcan.intake import PROPERTIES_WITH_EXCEL
+
+    def size(count):
+        return max(1, round(count * scale))
+
+    uploads = []
+    for prop_name, prop_code in PROPERTIES[:properties]:
+        def add(filename, data, report_type, period=None):
+            uploads.append({"filename": filename, "bytes": data, "prop_name": prop_name, "prop_code": prop_code,
+                            "report_type": report_type, "period": period})
+
+        for stem, title, period, pages in PDF_REPORTS:
+            add(f"{stem}_{prop_code}.pdf", yardi_report(prop_name, prop_code, title, period, size(pages), seed),
+                title)
+        if prop_code in PROPERTIES_WITH_EXCEL:
+            add(f"12_Month_Statement_{prop_code} T12.xlsx",
+                statement_workbook(prop_name, prop_code, T12_PERIOD, size(120), seed), "T-12 Statement", "T-12")
+            add(f"12_Month_Statement_{prop_code} YTD.xlsx",
+                statement_workbook(prop_name, prop_code, YTD_PERIOD, size(120), seed), "YTD Statement", "YTD")
+            add(f"General_Ledger_{prop_code}.xlsx", gl_workbook(prop_name, prop_code, size(5000), seed),
+                "General Ledger")
+        else:
+            add(f"12_Month_Statement_{prop_code}.pdf",
+                yardi_report(prop_name, prop_code, "12 Month Statement", T12_PERIOD, size(4), seed),
+                "T-12 Statement", "T-12")
+            add(f"12_Month_Statement_{prop_code} (1).pdf",
+                yardi_report(prop_name, prop_code, "12 Month Statement", YTD_PERIOD, size(4), seed),
+                "YTD Statement", "YTD")
+    return uploads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", type=Path, help="directory to write the reports to")
+    parser.add_argument("--properties", type=int, default=3, help=f"1 to {len(PROPERTIES)} (default: %(default)s)")
+    parser.add_argument("--scale", type=float, default=1.0, help="page/row count multiplier (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    args.output.mkdir(parents=True, exist_ok=True)
+    uploads = generate_corpus(args.properties, args.scale, args.seed)
+    for upload in uploads:
+        (args.output / upload["filename"]).write_bytes(upload["bytes"])
+    total = sum(len(upload["bytes"]) for upload in uploads)
+    print(f"{len(uploads)} files, {total / 1024 / 1024:.1f} MB in {args.output}")
+
+
+if __name__ == "__main__":
+    main()